@@ -434,47 +434,17 @@ class StandaloneBumpathBackend:
                     # unhash entry to another dict for ui display
                     if entry_hash not in self.entry_name:
                         try:
-                            self.entry_name[entry_hash] = bin.BINHasher.hex_to_raw(self.hashtables, entry_hash)
+                            self.entry_name[entry_hash] = bin.BINHasher.hex_to_raw(hashtables, entry_hash)
                         except:
                             self.entry_name[entry_hash] = f"Entry_{entry_hash}"
                     
                     # Get entry type name for display (like VFXSystemDefinitionData)
                     if entry_hash not in self.entry_type_name:
                         try:
-                            # entry.type is a number (type ID), convert to hex and look up in bintypes hashtable
+                            # entry.type is a hex string, look it up in the bintypes hashtable
                             if hasattr(entry, 'type') and entry.type is not None:
-                                type_hex = f'{entry.type:08x}'
-                                type_name = None
-                                
-                                # Try to load and lookup from bintypes hashtable file
-                                if self.hashtables and os.path.exists(self.hashtables):
-                                    bintypes_file = os.path.join(self.hashtables, 'hashes.bintypes.txt')
-                                    if os.path.exists(bintypes_file):
-                                        try:
-                                            with open(bintypes_file, 'r', encoding='utf-8') as f:
-                                                for line in f:
-                                                    line = line.strip()
-                                                    if not line or line.startswith('#'):
-                                                        continue
-                                                    # Format: hash=name or hash name
-                                                    parts = line.split('=', 1) if '=' in line else line.split(None, 1)
-                                                    if len(parts) >= 2 and parts[0].lower() == type_hex.lower():
-                                                        type_name = parts[1].strip()
-                                                        break
-                                        except Exception as e:
-                                            print(f"Error reading bintypes file: {e}")
-                                
-                                # If still not found, try using BINHasher if hashtables is a dict
-                                if not type_name:
-                                    try:
-                                        # Check if hashtables is already a dict (loaded)
-                                        if isinstance(self.hashtables, dict):
-                                            type_name = bin.BINHasher.hex_to_raw(self.hashtables, type_hex)
-                                            if type_name == type_hex:
-                                                type_name = None
-                                    except:
-                                        pass
-                                
+                                bintypes = hashtables.get('hashes.bintypes.txt')
+                                type_name = bintypes.get(entry.type) if bintypes else None
                                 self.entry_type_name[entry_hash] = type_name if type_name else None
                             else:
                                 self.entry_type_name[entry_hash] = None
@@ -487,19 +457,36 @@ class StandaloneBumpathBackend:
                 import traceback
                 traceback.print_exc()
 
-        # Load hashtables if available
+        # Load hashtables if available (compiled, reference counted, shared with the other endpoints)
+        hashtables = {}
+        hash_helper = None
         if self.hashtables and os.path.exists(self.hashtables):
             print(f"Using hashtables from: {self.hashtables}")
+            try:
+                from LtMAO import hash_helper
+                # Keep hashtables resident between requests (reloaded only if the files change)
+                hash_helper.Storage.resident = True
+                hash_helper.CustomHashes.local_dir = self.hashtables
+                hash_helper.Storage.read_bin_hashes()
+                hashtables = hash_helper.Storage.hashtables
+            except ImportError as e:
+                print(f"LtMAO hash_helper not available, using basic entry naming: {e}")
+                hash_helper = None
         else:
             print("No hashtables path provided, using basic entry naming")
 
-        # Scan selected BINs
-        for unify_file in self.source_bins:
-            if self.source_bins[unify_file]:
-                full, rel = self.source_files[unify_file]
-                # source bin is obviously existed
-                self.scanned_tree['All_BINs'][unify_file] = (True, rel)
-                scan_bin(full, unify_file)
+        try:
+            # Scan selected BINs
+            for unify_file in self.source_bins:
+                if self.source_bins[unify_file]:
+                    full, rel = self.source_files[unify_file]
+                    # source bin is obviously existed
+                    self.scanned_tree['All_BINs'][unify_file] = (True, rel)
+                    scan_bin(full, unify_file)
+        finally:
+            # Release hash tables (they stay resident for the next request)
+            if hash_helper is not None:
+                hash_helper.Storage.free_bin_hashes()
 
         # Sort by entry name
         self.scanned_tree = dict(sorted(self.scanned_tree.items(), key=lambda item: self.entry_name[item[0]]))
@@ -928,6 +915,7 @@ def get_logs():
 @app.route('/api/bumpath/repath', methods=['POST'])
 def bumpath_repath():
     """Run Bumpath repath with auto-selected skin files"""
+    hashes_acquired = False
     try:
         data = request.get_json()
         if not data:
@@ -986,6 +974,8 @@ def bumpath_repath():
                 print(f"Added LtMAO path: {minimal_ltmao_path}")
             
             from LtMAO import lepath, hash_helper, bumpath
+            # Keep hashtables resident between requests (reloaded only if the files change)
+            hash_helper.Storage.resident = True
             print("LtMAO modules imported successfully for repath")
             use_ltmao = True
         except ImportError as e:
@@ -999,9 +989,10 @@ def bumpath_repath():
                 print(f"Setting hash path: {hash_path}")
                 hash_helper.CustomHashes.local_dir = hash_path
             
-            # Load hash tables
+            # Load hash tables (reference counted, already loaded tables are reused)
             print("Loading hash tables...")
             hash_helper.Storage.read_all_hashes()
+            hashes_acquired = True
             print("Hash tables loaded successfully")
             
             # Create Bumpath instance
@@ -1197,10 +1188,6 @@ def bumpath_repath():
             except Exception as e:
                 print(f"Warning: Could not clean up extracted directory: {e}")
         
-        # Clean up hash tables
-        hash_helper.Storage.free_all_hashes()
-        print("Hash tables freed")
-        
         return jsonify({
             'success': True,
             'message': f'Successfully repathed skins {selected_skin_ids}',
@@ -1216,6 +1203,11 @@ def bumpath_repath():
             'error': 'Bumpath repath failed',
             'details': str(e)
         }), 500
+    finally:
+        # Release hash tables (they stay resident for the next request)
+        if hashes_acquired:
+            hash_helper.Storage.free_all_hashes()
+            print("Hash tables released")
 
 # WAD Extraction endpoints
 @app.route('/api/extract-wad', methods=['POST'])
@@ -1298,6 +1290,7 @@ def extract_wad():
         cancellation_requested = False
 
         # Import LtMAO modules for WAD extraction
+        hashes_acquired = False
         try:
             print("Attempting to import LtMAO modules...")
             
@@ -1389,6 +1382,8 @@ def extract_wad():
                         print(f"No PIL at: {path}")
             
             from LtMAO import lepath, wad_tool, hash_helper
+            # Keep hashtables resident between requests (reloaded only if the files change)
+            hash_helper.Storage.resident = True
             print("LtMAO modules imported successfully")
             
             # Set hash path if provided
@@ -1399,9 +1394,10 @@ def extract_wad():
             else:
                 print(f"Hash path not provided or doesn't exist: {hash_path}")
             
-            # Load hash tables
+            # Load hash tables (reference counted, already loaded tables are reused)
             print("Loading WAD hash tables...")
             hash_helper.Storage.read_wad_hashes()
+            hashes_acquired = True
             print("Hash tables loaded successfully")
             
             # Check for cancellation before extraction
@@ -1417,10 +1413,23 @@ def extract_wad():
             # Extract the WAD file using LtMAO's unpack function
             print(f"Starting WAD extraction from {wad_path} to {output_dir}")
             
+            unpack_stats = None
             try:
                 print(f"Starting WAD extraction with enhanced OneDrive/path handling...")
-                wad_tool.unpack(wad_path, output_dir, hash_helper.Storage.hashtables)
+                # optional selective extraction, evaluated on paths before any data is read
+                unpack_stats = wad_tool.unpack(
+                    wad_path, output_dir, hash_helper.Storage.hashtables,
+                    workers=os.cpu_count() or 1,
+                    include=data.get('include'),
+                    exclude=data.get('exclude'),
+                    extensions=data.get('extensions'),
+                    regex=data.get('regex'),
+                    max_size=data.get('maxSize'),
+                    # re-extract into the same folder skipping unchanged files (writes unpack_manifest.json)
+                    manifest=bool(data.get('incremental', False))
+                )
                 print(f"WAD extraction completed successfully")
+                print(f"  - Throughput: {unpack_stats['chunks_per_second']:.0f} chunks/s, {unpack_stats['mb_per_second']:.2f} MB/s ({unpack_stats['workers']} workers)")
                 
                 # Log extraction results
                 import glob
@@ -1470,10 +1479,6 @@ def extract_wad():
             if chroma_id is not None:
                 print(f"Chroma ID {chroma_id} specified - chroma-specific extraction could be implemented here")
             
-            # Clean up hash tables
-            hash_helper.Storage.free_wad_hashes()
-            print("Hash tables freed")
-            
         except ImportError as e:
             print(f"LtMAO modules not available: {e}")
             return jsonify({
@@ -1488,6 +1493,11 @@ def extract_wad():
                 'error': 'WAD extraction failed',
                 'details': str(e)
             }), 500
+        finally:
+            # Release hash tables (they stay resident for the next request)
+            if hashes_acquired:
+                hash_helper.Storage.free_wad_hashes()
+                print("Hash tables released")
         
         # Check if extraction was successful by looking for extracted files
         extracted_files = []
@@ -1503,7 +1513,8 @@ def extract_wad():
             'outputDir': output_dir,
             'skinId': skin_id,
             'extractedFiles': len(extracted_files),
-            'files': extracted_files[:10]  # Return first 10 files as sample
+            'files': extracted_files[:10],  # Return first 10 files as sample
+            'unpackStats': unpack_stats
         })
         
     except Exception as e:
@@ -1518,6 +1529,18 @@ def extract_wad():
             'traceback': traceback.format_exc()
         }), 500
 
+# Resident hashtables status (shared by all endpoints)
+@app.route('/api/hashes/status', methods=['GET'])
+def hashes_status():
+    """Show loaded hashtables, their references, memory use and load times"""
+    # Nothing to report until an endpoint imported hash_helper and loaded tables
+    hash_helper = sys.modules.get('LtMAO.hash_helper')
+    if hash_helper is None:
+        return jsonify({'loaded': False, 'resident': False, 'bytes': 0, 'tables': {}})
+    status = hash_helper.Storage.status()
+    status['loaded'] = len(status['tables']) > 0
+    return jsonify(status)
+
 # ===== MASK VIEWER ENDPOINTS =====
 
 @app.route('/api/mask-viewer/test', methods=['GET'])
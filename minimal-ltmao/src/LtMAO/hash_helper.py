@@ -2,8 +2,19 @@ try:
     import requests
 except: 
     print('Warning: hash_helper failed to import requests.')
-import os, os.path, json, traceback
+import os, os.path, sys, json, time, traceback, mmap, heapq, shutil, tempfile, hashlib
+from threading import RLock
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from struct import Struct
+from array import array
+from bisect import bisect_left
+from itertools import accumulate, islice
+from operator import itemgetter
+from functools import partial
+from io import BytesIO
 from . import lepath, pyRitoFile, setting
+# optional, same import as pyRitoFile.stream
+numpy = pyRitoFile.stream.numpy
 
 def get_hash_separator(filename):
     # space separator in hashes txt
@@ -39,13 +50,114 @@ ALL_HASHES = BIN_HASHES + WAD_HASHES
 class Storage:
     hashtables = {key: {} for key in ALL_HASHES}
     bin_hashes = Bin_Hashes()
+    # tables are reference counted: read_* loads a table only if it is not loaded
+    # or its custom hashes file changed, free_* unloads it when its last user frees it
+    # resident: keep unused tables loaded, for long running processes (backend)
+    # they are still dropped before their files are rewritten and remapped when their files change
+    resident = False
+    # {filename: load info} of loaded tables
+    tables = {}
+    lock = RLock()
 
-    def read_all_hashes(): CustomHashes.read_all_hashes()
-    def read_wad_hashes(): CustomHashes.read_wad_hashes()
-    def read_bin_hashes(): CustomHashes.read_bin_hashes()
-    def free_all_hashes(): CustomHashes.free_all_hashes()
-    def free_wad_hashes(): CustomHashes.free_wad_hashes()
-    def free_bin_hashes(): CustomHashes.free_bin_hashes()
+    def read_all_hashes(): Storage.acquire(*ALL_HASHES)
+    def read_wad_hashes(): Storage.acquire(*WAD_HASHES)
+    def read_bin_hashes(): Storage.acquire(*BIN_HASHES)
+    def free_all_hashes(): Storage.release(*ALL_HASHES)
+    def free_wad_hashes(): Storage.release(*WAD_HASHES)
+    def free_bin_hashes(): Storage.release(*BIN_HASHES)
+
+    def load_wad_hashes(compile=True, custom_dir=None, compiled_dir=None):
+        # read and return wad hashtables, hashtables_loader of wad_tool.unpack_batch
+        # compile False: only map compiled tables, pool workers after the parent compiled them
+        # custom_dir, compiled_dir: hash dirs of the parent, workers are fresh processes
+        if custom_dir != None:
+            CustomHashes.local_dir = custom_dir
+            CompiledHashes.local_dir = compiled_dir
+        Storage.acquire(*WAD_HASHES, compile=compile)
+        return Storage.hashtables
+
+    def wad_hashes_loader():
+        # load_wad_hashes of the current hash dirs, can be pickled to spawned workers
+        return partial(Storage.load_wad_hashes, custom_dir=CustomHashes.local_dir, compiled_dir=CompiledHashes.local_dir)
+
+    @staticmethod
+    def acquire(*filenames, compile=True):
+        with Storage.lock:
+            for filename in filenames:
+                local_file = CustomHashes.local_file(filename)
+                try:
+                    stat = os.stat(local_file)
+                    mtime, size = stat.st_mtime_ns, stat.st_size
+                except OSError:
+                    mtime, size = None, None
+                table = Storage.tables.get(filename)
+                # read from the txt while a compiled table waited to be swapped in: try again
+                swap_pending = table != None and not table['compiled'] and os.path.exists(
+                    CompiledHashes.local_file(filename) + '.tmp')
+                if table == None or table['file'] != local_file or table['mtime'] != mtime or table['size'] != size or swap_pending:
+                    # first use, other hash dir or file changed: (re)load, users keep their refs
+                    refs = table['refs'] if table != None else 0
+                    table = Storage.load(filename, local_file, mtime, size, compile)
+                    table['refs'] = refs
+                    Storage.tables[filename] = table
+                table['refs'] += 1
+
+    @staticmethod
+    def release(*filenames):
+        with Storage.lock:
+            for filename in filenames:
+                table = Storage.tables.get(filename)
+                if table == None:
+                    continue
+                table['refs'] = max(table['refs'] - 1, 0)
+                if table['refs'] == 0 and not Storage.resident:
+                    CustomHashes.free_hashes(filename)
+                    Storage.tables.pop(filename)
+
+    @staticmethod
+    def unmap(*filenames):
+        # drop unused tables before their files are rewritten
+        # a mapped compiled table can not be replaced on windows
+        with Storage.lock:
+            for filename in filenames:
+                table = Storage.tables.get(filename)
+                if table != None and table['refs'] == 0:
+                    CustomHashes.free_hashes(filename)
+                    Storage.tables.pop(filename)
+
+    @staticmethod
+    def load(filename, local_file, mtime, size, compile=True):
+        start_time = time.perf_counter()
+        CustomHashes.free_hashes(filename)
+        CustomHashes.read_hashes(filename, compile=compile)
+        hashtable = Storage.hashtables[filename]
+        # compiled = mapped file, shared with other processes through the page cache
+        compiled = isinstance(hashtable, HashTable) and hashtable.path != None
+        table_size = len(hashtable.data) if isinstance(hashtable, HashTable) else sys.getsizeof(hashtable)
+        load_seconds = time.perf_counter() - start_time
+        if mtime != None:
+            print(f'hash_helper: Finish: Load: {local_file}: {len(hashtable)} hashes in {load_seconds:.2f}s')
+        return {
+            'refs': 0,
+            'file': local_file,
+            'mtime': mtime,
+            'size': size,
+            'compiled': compiled,
+            'entries': len(hashtable),
+            'bytes': table_size,
+            'load_seconds': load_seconds,
+            'loaded_at': time.time()
+        }
+
+    @staticmethod
+    def status():
+        # json-able state of loaded tables
+        with Storage.lock:
+            return {
+                'resident': Storage.resident,
+                'bytes': sum(table['bytes'] for table in Storage.tables.values()),
+                'tables': {filename: dict(table) for filename, table in Storage.tables.items()}
+            }
 
 
 class CDTBHashes:
@@ -57,7 +169,11 @@ class CDTBHashes:
 
     def remote_file(filename):
         # return f'https://raw.githubusercontent.com/CommunityDragon/CDTB/master/cdragontoolbox/{filename}'
-        return f'https://raw.communitydragon.org/data/hashes/lol/{filename}'
+        return f'{CDTBHashes.remote_dir}/{filename}'
+
+    def part_file(filename):
+        # unfinished download, resumed with Range
+        return f'{CDTBHashes.local_dir}/{filename}.part'
     
     def calculate_size():
         total_size = 0
@@ -66,44 +182,119 @@ class CDTBHashes:
                 total_size += os.path.getsize(lepath.join(root, file))
         return to_human(total_size)
 
+    remote_dir = 'https://raw.communitydragon.org/data/hashes/lol'
     etag_path = f'{local_dir}/etag.json'
+    last_modified_path = f'{local_dir}/last_modified.json'
     ETAG = {}
+    LAST_MODIFIED = {}
+    workers = 6
+    timeout = 30
+
+    @staticmethod
+    def sync_hash(filename):
+        # download one hash file if the remote one changed, return True if it did
+        local_file = CDTBHashes.local_file(filename)
+        remote_file = CDTBHashes.remote_file(filename)
+        part_file = CDTBHashes.part_file(filename)
+        part_info_file = part_file + '.json'
+        headers = {}
+        # conditional GET: unchanged file = 304, no body
+        if os.path.exists(local_file):
+            if CDTBHashes.ETAG.get(filename, None) != None:
+                headers['If-None-Match'] = CDTBHashes.ETAG[filename]
+            if CDTBHashes.LAST_MODIFIED.get(filename, None) != None:
+                headers['If-Modified-Since'] = CDTBHashes.LAST_MODIFIED[filename]
+        # resume: ask for the rest of the part file, only if it is still the same remote file
+        part_size = 0
+        part_info = None
+        if os.path.exists(part_file) and os.path.exists(part_info_file):
+            with open(part_info_file, 'r', encoding='utf-8') as f:
+                part_info = json.load(f)
+            part_validator = part_info.get('etag', None) or part_info.get('last_modified', None)
+            if part_validator != None:
+                part_size = os.path.getsize(part_file)
+                headers['Range'] = f'bytes={part_size}-'
+                headers['If-Range'] = part_validator
+        with requests.get(remote_file, headers=headers, stream=True, timeout=CDTBHashes.timeout) as get:
+            if get.status_code == 304:
+                # the part file is an older or newer download than the local file, no use now
+                if os.path.exists(part_file):
+                    os.remove(part_file)
+                print(f'hash_helper: Finish: Up to date: {local_file}')
+                return False
+            get.raise_for_status()
+            etag_remote = get.headers.get('ETag', None)
+            last_modified_remote = get.headers.get('Last-Modified', None)
+            # server ignored If-None-Match but the etag still says nothing changed
+            if etag_remote != None and etag_remote == CDTBHashes.ETAG.get(filename, None) and os.path.exists(local_file):
+                print(f'hash_helper: Finish: Up to date: {local_file}')
+                return False
+            if get.status_code == 206:
+                # Content-Range: bytes start-end/total
+                content_range = get.headers.get('Content-Range', '')
+                range_start = int(content_range.split(' ')[-1].split('-')[0])
+                if range_start != part_size:
+                    raise Exception(f'Content-Range {content_range} does not continue {part_size} bytes.')
+                total_size = int(content_range.split('/')[-1]) if not content_range.endswith('/*') else None
+                if 'Content-Encoding' in get.headers:
+                    total_size = None
+                mode = 'ab'
+                print(f'hash_helper: Resuming: {remote_file}: {to_human(part_size)}')
+            else:
+                # full body: start over
+                # sizes are only known when requests does not decode the body
+                part_size = 0
+                total_size = int(get.headers['Content-Length']) if 'Content-Length' in get.headers and 'Content-Encoding' not in get.headers else None
+                mode = 'wb'
+                # remember which remote file the part belongs to, for resuming
+                with open(part_info_file, 'w', encoding='utf-8') as f:
+                    json.dump({'etag': etag_remote, 'last_modified': last_modified_remote}, f)
+            # download file
+            bytes_downloaded = part_size
+            # small chunks: a dropped connection loses at most one chunk of the part file
+            chunk_size = 1024*64
+            bytes_downloaded_log = 0
+            bytes_downloaded_log_limit = 1024**2
+            with open(part_file, mode) as f:
+                for chunk in get.iter_content(chunk_size):
+                    chunk_length = len(chunk)
+                    bytes_downloaded += chunk_length
+                    f.write(chunk)
+                    bytes_downloaded_log += chunk_length
+                    if bytes_downloaded_log > bytes_downloaded_log_limit:
+                        print(
+                            f'hash_helper: Downloading: {remote_file}: {to_human(bytes_downloaded)}')
+                        bytes_downloaded_log = 0
+            if total_size != None and bytes_downloaded != total_size:
+                raise Exception(f'Downloaded {bytes_downloaded} of {total_size} bytes, run sync again to resume.')
+        # swap in the finished file, readers never see a half written one
+        os.replace(part_file, local_file)
+        if os.path.exists(part_info_file):
+            os.remove(part_info_file)
+        CDTBHashes.ETAG[filename] = etag_remote
+        CDTBHashes.LAST_MODIFIED[filename] = last_modified_remote
+        print(f'hash_helper: Finish: Sync hash: {local_file}')
+        return True
 
     @staticmethod
     def sync_hashes(*filenames):
-        for filename in filenames:
+        # download in parallel, then combine only the tables that changed
+        def sync_hash(filename):
             try:
-                local_file = CDTBHashes.local_file(filename)
-                remote_file = CDTBHashes.remote_file(filename)
-                # GET request
-                get = requests.get(remote_file, stream=True)
-                get.raise_for_status()
-                # get etag and compare, new etag = sync
-                etag_local = CDTBHashes.ETAG.get(filename, None)
-                etag_remote = get.headers['ETag']
-                if etag_local == None or etag_local != etag_remote or not os.path.exists(local_file):
-                    # set etag
-                    CDTBHashes.ETAG[filename] = etag_remote
-                    # download file
-                    bytes_downloaded = 0
-                    chunk_size = 1024**2*5
-                    bytes_downloaded_log = 0
-                    bytes_downloaded_log_limit = 1024**2
-                    with open(local_file, 'wb') as f:
-                        for chunk in get.iter_content(chunk_size):
-                            chunk_length = len(chunk)
-                            bytes_downloaded += chunk_length
-                            f.write(chunk)
-                            bytes_downloaded_log += chunk_length
-                            if bytes_downloaded_log > bytes_downloaded_log_limit:
-                                print(
-                                    f'hash_helper: Downloading: {remote_file}: {to_human(bytes_downloaded)}')
-                                bytes_downloaded_log = 0
-                print(f'hash_helper: Finish: Sync hash: {local_file}')
+                return CDTBHashes.sync_hash(filename)
             except Exception as e:
                 print(f'hash_helper: Error: Sync hash: {filename}: {e}')
                 print(traceback.format_exc())
-            CustomHashes.combine_custom_hashes(filename)
+                return False
+        with ThreadPoolExecutor(max_workers=max(min(CDTBHashes.workers, len(filenames)), 1)) as executor:
+            changes = list(executor.map(sync_hash, filenames))
+        for filename, changed in zip(filenames, changes):
+            if changed or not os.path.exists(CustomHashes.local_file(filename)):
+                try:
+                    CustomHashes.combine_custom_hashes(filename)
+                except Exception as e:
+                    print(f'hash_helper: Error: Combine hashes: {filename}: {e}')
+                    print(traceback.format_exc())
         print(f'hash_helper: Finish: Sync all hashes.')
 
     @staticmethod
@@ -113,15 +304,36 @@ class CDTBHashes:
         if os.path.exists(CDTBHashes.etag_path):
             with open(CDTBHashes.etag_path, 'r', encoding='utf-8') as f:
                 CDTBHashes.ETAG = json.load(f)
+        CDTBHashes.LAST_MODIFIED = {}
+        if os.path.exists(CDTBHashes.last_modified_path):
+            with open(CDTBHashes.last_modified_path, 'r', encoding='utf-8') as f:
+                CDTBHashes.LAST_MODIFIED = json.load(f)
         CDTBHashes.sync_hashes(*ALL_HASHES)
         # write etags
         with open(CDTBHashes.etag_path, 'w+', encoding='utf-8') as f:
             json.dump(CDTBHashes.ETAG, f, indent=4, ensure_ascii=False)
+        with open(CDTBHashes.last_modified_path, 'w+', encoding='utf-8') as f:
+            json.dump(CDTBHashes.LAST_MODIFIED, f, indent=4, ensure_ascii=False)
 
 
 class ExtractedHashes:
     # extracted hash
     local_dir = './pref/hashes/extracted_hashes'
+    # bin strings starting with these are game paths
+    start_game_path = (
+        'assets/', 
+        'clientstates/',
+        'data/',
+        'levels/',
+        'maps/',
+        'uiautoatlas/',
+        'ux/'
+    )
+    # extract cache: {content key: {filename: {hex: raw}}} of every file or wad chunk seen,
+    # so files and chunks that did not change are not read again
+    CACHE_VERSION = 1
+    # wad chunks per worker task
+    TASK_CHUNKS = 256
 
     def local_file(filename): 
         return f'{ExtractedHashes.local_dir}/{filename}'
@@ -134,6 +346,31 @@ class ExtractedHashes:
                 total_size += os.path.getsize(lepath.join(root, file))
         return to_human(total_size)
     
+    def cache_file():
+        return f'{ExtractedHashes.local_dir}/extract_cache.json'
+
+    @staticmethod
+    def read_cache():
+        cache_file = ExtractedHashes.cache_file()
+        if not os.path.exists(cache_file):
+            return {}
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+            if cache.get('version', None) == ExtractedHashes.CACHE_VERSION:
+                return cache['entries']
+        except Exception as e:
+            print(f'hash_helper: Warning: Read extract cache: {cache_file}: {e}')
+        return {}
+
+    @staticmethod
+    def write_cache(entries):
+        cache_file = ExtractedHashes.cache_file()
+        with open(cache_file + '.tmp', 'w', encoding='utf-8') as f:
+            # dumps: the C encoder, dump to a file streams through the python one
+            f.write(json.dumps({'version': ExtractedHashes.CACHE_VERSION, 'entries': entries}, ensure_ascii=False))
+        os.replace(cache_file + '.tmp', cache_file)
+    
     @staticmethod
     def clear_extract_hashes(*filenames):
         for filename in filenames:
@@ -141,162 +378,290 @@ class ExtractedHashes:
             if os.path.exists(eh_file):
                 os.remove(lepath.abs(eh_file))
         print('hash_helper: Finish: Clear Extract Hashes.')
-    
+
+    @staticmethod
+    def extract_skn(hashtables, path, raw=False):
+        try:
+            # extract submesh hash <-> submesh name
+            skn = pyRitoFile.skn.SKN().read(path, raw)
+            for submesh in skn.submeshes:
+                hashtables['hashes.binhashes.txt'][submesh.bin_hash] = submesh.name
+            return True
+        except Exception as e:
+            print(f'hash_helper: Error: {e}')
+            print(traceback.format_exc())
+            return False
+
     @staticmethod
-    def extract(*file_paths):
+    def extract_skl(hashtables, path, raw=False):
+        try:
+            # extract joint hash <-> joint name
+            skl = pyRitoFile.skl.SKL().read(path, raw)
+            for joint in skl.joints:
+                hashtables['hashes.binhashes.txt'][joint.bin_hash] = joint.name
+            return True
+        except Exception as e:
+            print(f'hash_helper: Error: {e}')
+            print(traceback.format_exc())
+            return False
+
+    @staticmethod
+    def extract_bin(hashtables, path, raw=False):
         wad_hash = pyRitoFile.wad.WADHasher.raw_to_hex
-        start_game_path = [
-            'assets/', 
-            'clientstates/',
-            'data/',
-            'levels/',
-            'maps/',
-            'uiautoatlas/',
-            'ux/'
-        ]
+        start_game_path = ExtractedHashes.start_game_path
+
+        def extract_file_value(value, value_type):
+            if value_type == pyRitoFile.bin.BINType.STRING:
+                value = value.lower()
+                if value.startswith(start_game_path):
+                    hashtables['hashes.game.txt'][wad_hash(
+                        value)] = value
+                    if value.endswith('.dds'):
+                        temp = value.split('/')
+                        basename = temp[-1]
+                        dirname = '/'.join(temp[:-1])
+                        value2x = f'{dirname}/2x_{basename}'
+                        value4x = f'{dirname}/4x_{basename}'
+                        hashtables['hashes.game.txt'][wad_hash(
+                            value2x)] = value2x
+                        hashtables['hashes.game.txt'][wad_hash(
+                            value4x)] = value4x
+                    elif value.endswith('.bin'):
+                        valuepy = lepath.ext(value, '.bin', '.py')
+                        hashtables['hashes.game.txt'][wad_hash(valuepy)] = valuepy
+            elif value_type in (pyRitoFile.bin.BINType.LIST, pyRitoFile.bin.BINType.LIST2):
+                for v in value.data:
+                    extract_file_value(v, value_type)
+            elif value_type in (pyRitoFile.bin.BINType.EMBED, pyRitoFile.bin.BINType.POINTER):
+                if value.data != None:
+                    for f in value.data:
+                        extract_file_field(f)
+
+        def extract_file_field(field):
+            if field.type in (pyRitoFile.bin.BINType.LIST, pyRitoFile.bin.BINType.LIST2):
+                for v in field.data:
+                    extract_file_value(v, field.value_type)
+            elif field.type in (pyRitoFile.bin.BINType.EMBED, pyRitoFile.bin.BINType.POINTER):
+                if field.data != None:
+                    for f in field.data:
+                        extract_file_field(f)
+            elif field.type == pyRitoFile.bin.BINType.MAP:
+                for key, value in field.data.items():
+                    extract_file_value(key, field.key_type)
+                    extract_file_value(value, field.value_type)
+            elif field.type == pyRitoFile.bin.BINType.OPTION and field.value_type == pyRitoFile.bin.BINType.STRING:
+                if field.data != None:
+                    extract_file_value(field.data, field.value_type)
+            else:
+                extract_file_value(field.data, field.type)
 
+        try:
+            bin = pyRitoFile.bin.BIN().read(path, raw)
+            # extract VfxSystemDefinitionData <-> particlePath
+            VfxSystemDefinitionDatas = bin.get_items(lambda entry: entry.type == Storage.bin_hashes['VfxSystemDefinitionData'])
+            for VfxSystemDefinitionData in VfxSystemDefinitionDatas:
+                particlePaths = VfxSystemDefinitionData.get_items(lambda field: field.hash == Storage.bin_hashes['particlePath'])
+                if len(particlePaths) > 0:
+                    hashtables['hashes.binentries.txt'][VfxSystemDefinitionData.hash] = particlePaths[0].data
+            # extract StaticMaterialDef <-> name
+            StaticMaterialDefs = bin.get_items(lambda entry: entry.type == Storage.bin_hashes['StaticMaterialDef'])
+            for StaticMaterialDef in StaticMaterialDefs:
+                names = StaticMaterialDef.get_items(lambda field: field.hash == Storage.bin_hashes['name'])
+                if len(names) > 0:
+                    hashtables['hashes.binentries.txt'][StaticMaterialDef.hash] = names[0].data
+            # extract file hashes
+            for entry in bin.entries:
+                for field in entry.data:
+                    extract_file_field(field)
+            for link in bin.links:
+                extract_file_value(link, pyRitoFile.bin.BINType.STRING)
+            return True
+        except Exception as e:
+            print(f'hash_helper: Error: {e}')
+            print(traceback.format_exc())
+            return False
+
+    @staticmethod
+    def extract_data(extension, path, raw=False):
+        # {filename: {hex: raw}} of one skn/skl/bin, only tables with hashes
+        # None if it can not be read, so it is not cached and tried again next time
         hashtables = {
             'hashes.binentries.txt': {},
             'hashes.binhashes.txt': {},
             'hashes.game.txt': {}
         }
-        def extract_skn(path, raw=False):
-            try:
-                # extract submesh hash <-> submesh name
-                skn = pyRitoFile.skn.SKN().read(path, raw)
-                for submesh in skn.submeshes:
-                    hashtables['hashes.binhashes.txt'][submesh.bin_hash] = submesh.name
-                    print(f'hash_helper: Finish: Extract: {submesh.name}')
-            except Exception as e:
-                print(f'hash_helper: Error: {e}')
-                print(traceback.format_exc())
-                
-
-        def extract_skl(path, raw=False):
-            try:
-                # extract joint hash <-> joint name
-                skl = pyRitoFile.skl.SKL().read(path, raw)
-                for joint in skl.joints:
-                    hashtables['hashes.binhashes.txt'][joint.bin_hash] = joint.name
-                    print(f'hash_helper: Finish: Extract: {joint.name}')
-            except Exception as e:
-                print(f'hash_helper: Error: {e}')
-                print(traceback.format_exc())
-
-        def extract_bin(path, raw=False):
-            def extract_file_value(value, value_type):
-                if value_type == pyRitoFile.bin.BINType.STRING:
-                    value = value.lower()
-                    if any(value.startswith(prefix) for prefix in start_game_path):
-                        hashtables['hashes.game.txt'][wad_hash(
-                            value)] = value
-                        print(f'hash_helper: Finish: Extract: {value}')
-                        if value.endswith('.dds'):
-                            temp = value.split('/')
-                            basename = temp[-1]
-                            dirname = '/'.join(temp[:-1])
-                            value2x = f'{dirname}/2x_{basename}'
-                            value4x = f'{dirname}/4x_{basename}'
-                            hashtables['hashes.game.txt'][wad_hash(
-                                value2x)] = value2x
-                            hashtables['hashes.game.txt'][wad_hash(
-                                value4x)] = value4x
-                        elif value.endswith('.bin'):
-                            valuepy = lepath.ext(value, '.bin', '.py')
-                            hashtables['hashes.game.txt'][wad_hash(valuepy)] = valuepy
-                elif value_type in (pyRitoFile.bin.BINType.LIST, pyRitoFile.bin.BINType.LIST2):
-                    for v in value.data:
-                        extract_file_value(v, value_type)
-                elif value_type in (pyRitoFile.bin.BINType.EMBED, pyRitoFile.bin.BINType.POINTER):
-                    if value.data != None:
-                        for f in value.data:
-                            extract_file_field(f)
-
-            def extract_file_field(field):
-                if field.type in (pyRitoFile.bin.BINType.LIST, pyRitoFile.bin.BINType.LIST2):
-                    for v in field.data:
-                        extract_file_value(v, field.value_type)
-                elif field.type in (pyRitoFile.bin.BINType.EMBED, pyRitoFile.bin.BINType.POINTER):
-                    if field.data != None:
-                        for f in field.data:
-                            extract_file_field(f)
-                elif field.type == pyRitoFile.bin.BINType.MAP:
-                    for key, value in field.data.items():
-                        extract_file_value(key, field.key_type)
-                        extract_file_value(value, field.value_type)
-                elif field.type == pyRitoFile.bin.BINType.OPTION and field.value_type == pyRitoFile.bin.BINType.STRING:
-                    if field.data != None:
-                        extract_file_value(field.data, field.value_type)
-                else:
-                    extract_file_value(field.data, field.type)
+        ok = True
+        if extension == 'skn':
+            ok = ExtractedHashes.extract_skn(hashtables, path, raw)
+        elif extension == 'skl':
+            ok = ExtractedHashes.extract_skl(hashtables, path, raw)
+        elif extension == 'bin':
+            ok = ExtractedHashes.extract_bin(hashtables, path, raw)
+        if not ok:
+            return None
+        return {filename: hashtable for filename, hashtable in hashtables.items() if len(hashtable) > 0}
 
-            try:
-                bin = pyRitoFile.bin.BIN().read(path, raw)
-                # extract VfxSystemDefinitionData <-> particlePath
-                VfxSystemDefinitionDatas = bin.get_items(lambda entry: entry.type == Storage.bin_hashes['VfxSystemDefinitionData'])
-                for VfxSystemDefinitionData in VfxSystemDefinitionDatas:
-                    particlePaths = VfxSystemDefinitionData.get_items(lambda field: field.hash == Storage.bin_hashes['particlePath'])
-                    if len(particlePaths) > 0:
-                        hashtables['hashes.binentries.txt'][VfxSystemDefinitionData.hash] = particlePaths[0].data
-                        print(f'hash_helper: Finish: Extract: {particlePaths[0].data}')
-                # extract StaticMaterialDef <-> name
-                StaticMaterialDefs = bin.get_items(lambda entry: entry.type == Storage.bin_hashes['StaticMaterialDef'])
-                for StaticMaterialDef in StaticMaterialDefs:
-                    names = StaticMaterialDef.get_items(lambda field: field.hash == Storage.bin_hashes['name'])
-                    if len(names) > 0:
-                        hashtables['hashes.binentries.txt'][StaticMaterialDef.hash] = names[0].data
-                        print(f'hash_helper: Finish: Extract: {names[0].data}')
-                # extract file hashes
-                for entry in bin.entries:
-                    for field in entry.data:
-                        extract_file_field(field)
-                for link in bin.links:
-                    extract_file_value(link, pyRitoFile.bin.BINType.STRING)
-            except Exception as e:
-                print(f'hash_helper: Error: {e}')
-                print(traceback.format_exc())
-                
-        def extract_wad(path):
-            wad = pyRitoFile.wad.WAD().read(path)
-            with pyRitoFile.stream.BytesStream.reader(path) as bs:
-                for chunk in wad.chunks:
+    @staticmethod
+    def extract_task(path, chunk_ids, extensions=None):
+        # run by a worker: hashes of a loose file (chunk_ids = None) or of some chunks of a wad
+        # chunk_ids come in offset order, so the wad is read front to back
+        # extensions: extension of each chunk known from its name, None = sniff the header
+        # return [{filename: {hex: raw}}] one per file/chunk, None for a file/chunk that can not be read
+        if chunk_ids == None:
+            return [ExtractedHashes.extract_data(path.split('.')[-1], path)]
+        if extensions == None:
+            extensions = [None] * len(chunk_ids)
+        try:
+            index = pyRitoFile.wad.WAD().read(path, mmap=True).index
+            results = []
+            with pyRitoFile.stream.BytesStream.reader(path, mmap=True) as bs:
+                for chunk_id, extension in zip(chunk_ids, extensions):
+                    chunk = index.chunk(chunk_id)
+                    # only decompress the file types we extract from
+                    if extension == None:
+                        extension = chunk.sniff_extension(bs)
+                    if extension not in ('skn', 'skl', 'bin'):
+                        results.append({})
+                        continue
                     chunk.read_data(bs)
-                    if chunk.extension == 'skn':
-                        extract_skn(chunk.data, raw=True)
-                    elif chunk.extension == 'skl':
-                        extract_skl(chunk.data, raw=True)
-                    elif chunk.extension == 'bin':
-                        extract_bin(chunk.data, raw=True)
+                    results.append(ExtractedHashes.extract_data(extension, chunk.data, raw=True))
                     chunk.free_data()
-            
-
-        # extract hashes base on file types
-        for file_path in file_paths:
-            if file_path.endswith('.wad.client'):
-                extract_wad(file_path)
-            elif file_path.endswith('.skn'):
-                extract_skn(file_path)
-            elif file_path.endswith('.skl'):
-                extract_skl(file_path)
-            elif file_path.endswith('.bin'):
-                extract_bin(file_path)
+            return results
+        except Exception as e:
+            print(f'hash_helper: Error: Extract: {path}: {e}')
+            print(traceback.format_exc())
+            return [None] * len(chunk_ids)
+    
+    @staticmethod
+    def extract(*file_paths, processes=None, cache=True):
+        # files and wad chunks are extracted across a process pool, workers return small
+        # {filename: {hex: raw}} maps that are merged here in file order
+        # cache: skip files and chunks whose content was extracted before,
+        # keyed by toc checksum for wad chunks and by content hash for loose files
+        extract_cache = ExtractedHashes.read_cache() if cache else {}
+        # content key of every file/chunk in order, a key not in str is never cached
+        keys = []
+        # {key: hashes} of this run
+        found = {}
+        # (path, chunk_ids or None, extensions or None, keys) to extract
+        tasks = []
+        pending = set()
+        # chunks skipped by name, their empty result still goes to the cache
+        skipped = 0
+        # known names tell a chunk type without reading it
+        Storage.acquire(*WAD_HASHES)
+        try:
+            for file_path in file_paths:
+                if file_path.endswith('.wad.client'):
+                    try:
+                        index = pyRitoFile.wad.WAD().read(file_path, mmap=True).index
+                    except Exception as e:
+                        print(f'hash_helper: Error: Extract: {file_path}: {e}')
+                        continue
+                    paths = pyRitoFile.wad.WADHasher.hashes_to_raws(Storage.hashtables, index.hashes)
+                    todo = []
+                    for chunk_id in range(len(index)):
+                        # checksum 0 = wad version without checksums
+                        checksum = index.checksums[chunk_id]
+                        key = f'chunk:{checksum:016x}:{index.compressed_sizes[chunk_id]}' if checksum != 0 else (file_path, chunk_id)
+                        keys.append(key)
+                        if key in extract_cache:
+                            found[key] = extract_cache[key]
+                        elif key not in pending:
+                            # same chunk in many wads is extracted once
+                            pending.add(key)
+                            extension = pyRitoFile.wad.WADExtensioner.get_extension(paths[chunk_id])
+                            if extension != None and extension not in ('skn', 'skl', 'bin'):
+                                # dds, tex, wpk...: nothing to extract, never read
+                                found[key] = {}
+                                if isinstance(key, str):
+                                    extract_cache[key] = {}
+                                skipped += 1
+                                continue
+                            todo.append((index.offsets[chunk_id], chunk_id, extension, key))
+                    # offset order: each task reads its part of the wad front to back
+                    todo.sort(key=itemgetter(0))
+                    for start in range(0, len(todo), ExtractedHashes.TASK_CHUNKS):
+                        batch = todo[start:start+ExtractedHashes.TASK_CHUNKS]
+                        tasks.append((
+                            file_path,
+                            [chunk_id for offset, chunk_id, extension, key in batch],
+                            [extension for offset, chunk_id, extension, key in batch],
+                            [key for offset, chunk_id, extension, key in batch]
+                        ))
+                elif file_path.endswith(('.skn', '.skl', '.bin')):
+                    with open(file_path, 'rb') as f:
+                        key = f'file:{hashlib.blake2b(f.read(), digest_size=16).hexdigest()}'
+                    keys.append(key)
+                    if key in extract_cache:
+                        found[key] = extract_cache[key]
+                    elif key not in pending:
+                        pending.add(key)
+                        tasks.append((file_path, None, None, [key]))
+        finally:
+            Storage.release(*WAD_HASHES)
+        if processes == None:
+            processes = os.cpu_count() or 1
+        processes = max(min(processes, len(tasks)), 1)
+        print(f'hash_helper: Start: Extract: {len(file_paths)} files, {len(keys)} files and chunks, {len(pending)} not in cache, {skipped} skipped by name, {processes} processes')
+        # progress per file: printed when the last task of a file is done
+        task_counts = {}
+        for path, chunk_ids, extensions, task_keys in tasks:
+            task_counts[path] = task_counts.get(path, 0) + 1
+        hash_counts = {}
+        executor = ProcessPoolExecutor(max_workers=processes) if processes > 1 else None
+        try:
+            paths = [path for path, chunk_ids, extensions, task_keys in tasks]
+            chunk_ids_list = [chunk_ids for path, chunk_ids, extensions, task_keys in tasks]
+            extensions_list = [extensions for path, chunk_ids, extensions, task_keys in tasks]
+            if executor != None:
+                outputs = executor.map(ExtractedHashes.extract_task, paths, chunk_ids_list, extensions_list)
+            else:
+                outputs = map(ExtractedHashes.extract_task, paths, chunk_ids_list, extensions_list)
+            for (path, chunk_ids, extensions, task_keys), results in zip(tasks, outputs):
+                for key, hashes in zip(task_keys, results):
+                    if hashes == None:
+                        continue
+                    found[key] = hashes
+                    if isinstance(key, str):
+                        extract_cache[key] = hashes
+                    hash_counts[path] = hash_counts.get(path, 0) + sum(len(hashtable) for hashtable in hashes.values())
+                task_counts[path] -= 1
+                if task_counts[path] == 0:
+                    print(f'hash_helper: Finish: Extract: {path}: {hash_counts.get(path, 0)} hashes')
+        finally:
+            if executor != None:
+                executor.shutdown()
+        if cache and (len(tasks) > 0 or skipped > 0):
+            ExtractedHashes.write_cache(extract_cache)
+        # merge in file order, later files win like before
+        hashtables = {
+            'hashes.binentries.txt': {},
+            'hashes.binhashes.txt': {},
+            'hashes.game.txt': {}
+        }
+        for key in keys:
+            hashes = found.get(key, None)
+            if hashes:
+                for filename, hashtable in hashes.items():
+                    hashtables[filename].update(hashtable)
         # write out hashes txt
         for filename, hashtable in hashtables.items():
+            # nothing new, the txt and custom hashes stay as they are
+            if len(hashtable) == 0:
+                continue
             local_file = ExtractedHashes.local_file(filename)
             sep = get_hash_separator(filename)
-            # read existed extracted hashes
+            # merge new hashes into existed extracted hashes, existed ones win like before
+            sources = []
             if os.path.exists(local_file):
-                with open(local_file, 'r', encoding='utf-8') as f:
-                    for line in f:
-                        hashtable[line[:sep]] = line[sep+1:-1]
-            # write
-            with open(local_file, 'w+', encoding='utf-8') as f:
-                f.writelines(
-                    f'{key} {value}\n'
-                    for key, value in sorted(
-                        hashtable.items(), key=lambda item: item[1]
-                    )
-                )
+                HashFile.sort(local_file, sep)
+                # nothing new, the txt and custom hashes stay as they are
+                if len(HashFile.missing(local_file, sep, hashtable)) == 0:
+                    continue
+                sources.append(HashFile.read(local_file, sep))
+            sources.insert(0, HashFile.from_hexes(hashtable))
+            HashFile.write(local_file, HashFile.merge(*sources), sep)
             print(f'hash_helper: Finish: Extract: {local_file}')
             CustomHashes.combine_custom_hashes(filename)
 
@@ -317,16 +682,19 @@ class CustomHashes:
         return to_human(total_size)
 
     @staticmethod
-    def read_hashes(*filenames):
+    def read_hashes(*filenames, compile=True):
         for filename in filenames:
             local_file = CustomHashes.local_file(filename)
             # safe check
             if os.path.exists(local_file):
-                # read hashes
-                with open(local_file, 'r', encoding='utf-8') as f:
-                    sep = get_hash_separator(filename)
-                    for line in f:
-                        Storage.hashtables[filename][line[:sep]] = line[sep+1:-1]
+                # compiled table: memory mapped, nothing is parsed
+                hashtable = CompiledHashes.open(filename, compile)
+                if hashtable != None:
+                    Storage.hashtables[filename] = hashtable
+                    continue
+                # can not compile: read hashes into the same compact table, in memory
+                sep = get_hash_separator(filename)
+                Storage.hashtables[filename] = HashTable.from_hashes(HashTable.parse(local_file, sep), sep // 2)
 
     @staticmethod
     def write_hashes(*filenames):
@@ -337,7 +705,7 @@ class CustomHashes:
                 f.writelines(
                     f'{key} {value}\n'
                     for key, value in sorted(
-                        Storage.hashtables[filename].items(), key=lambda item: item[1]
+                        Storage.hashtables[filename].items(), key=lambda item: item[0]
                     )
                 )
 
@@ -372,36 +740,31 @@ class CustomHashes:
 
     @staticmethod
     def combine_custom_hashes(*filenames):
+        Storage.unmap(*filenames)
         for filename in filenames:
-            hashtable = {}
             cdtb_file = CDTBHashes.local_file(filename)
             ex_file = ExtractedHashes.local_file(filename)
             ch_file = CustomHashes.local_file(filename)
             sep = get_hash_separator(filename)
-            # read cdtb hashes
-            if os.path.exists(cdtb_file):
-                with open(cdtb_file, 'r', encoding='utf-8') as f:
-                    for line in f:
-                        hashtable[line[:sep]] = line[sep+1:-1]
-            # read extracted hashes
-            if os.path.exists(ex_file):
-                with open(ex_file, 'r', encoding='utf-8') as f:
-                    for line in f:
-                        hashtable[line[:sep]] = line[sep+1:-1]
-            # read existed custom hashes
-            if os.path.exists(ch_file):
-                with open(ch_file, 'r', encoding='utf-8') as f:
-                    for line in f:
-                        hashtable[line[:sep]] = line[sep+1:-1]
-            # write combined hashes
-            with open(ch_file, 'w+', encoding='utf-8') as f:
-                f.writelines(
-                    f'{key} {value}\n'
-                    for key, value in sorted(
-                        hashtable.items(), key=lambda item: item[1]
-                    )
-                )
+            # streaming merge of hashes txt sorted by hash, nothing is held in memory
+            # precedence: custom > extracted > cdtb (later source wins)
+            sources = []
+            for local_file in (cdtb_file, ex_file, ch_file):
+                if os.path.exists(local_file):
+                    # once for old txt sorted by name and fresh cdtb downloads
+                    HashFile.sort(local_file, sep)
+                    sources.append(HashFile.read(local_file, sep))
+            # the merged hashes also go straight into the compiled table
+            writer = CompiledHashes.writer(filename)
+            hashes = HashFile.merge(*sources)
+            if writer != None:
+                hashes = writer.feed(hashes)
+            HashFile.write(ch_file, hashes, sep)
             print(f'hash_helper: Finish: Update: {ch_file}')
+            if writer != None:
+                stat = os.stat(ch_file)
+                if writer.close(stat.st_mtime_ns, stat.st_size):
+                    print(f'hash_helper: Finish: Compile: {writer.path}')
 
     @staticmethod
     def reset_custom_hashes(*filenames):
@@ -413,14 +776,479 @@ class CustomHashes:
                 data = f.read()
             with open(ch_file, 'wb+') as f:
                 f.write(data)
+            CompiledHashes.compile(filename)
         print('hash_helper: Finish: Reset Custom Hashes to CDTB Hashes.')
 
+
+class HashFile:
+    # hashes txt kept sorted by hash, so tables can be merged as streams
+    # a stream is (int hash, raw) in ascending hash order
+    RUN_SIZE = 200000
+    READ_SIZE = 1024**2*4
+
+    @staticmethod
+    def read_batches(f, sep):
+        # ([hash], [line]) for about READ_SIZE bytes of lines at a time, lines without a hash are skipped
+        while True:
+            lines = f.readlines(HashFile.READ_SIZE)
+            if len(lines) == 0:
+                break
+            if not lines[-1].endswith('\n'):
+                lines[-1] += '\n'
+            try:
+                hashes = [int(line[:sep], 16) for line in lines]
+            except ValueError:
+                hashes = []
+                hash_lines = []
+                for line in lines:
+                    try:
+                        hashes.append(int(line[:sep], 16))
+                        hash_lines.append(line)
+                    except ValueError:
+                        continue
+                lines = hash_lines
+            yield hashes, lines
+
+    @staticmethod
+    def read_file(f, sep):
+        for hashes, lines in HashFile.read_batches(f, sep):
+            yield from zip(hashes, [line[sep+1:-1] for line in lines])
+
+    @staticmethod
+    def read(local_file, sep):
+        with open(local_file, 'r', encoding='utf-8') as f:
+            yield from HashFile.read_file(f, sep)
+
+    @staticmethod
+    def from_hexes(hashtable):
+        # stream of a {hex: raw} dict
+        hashes = []
+        for hex, raw in hashtable.items():
+            try:
+                hashes.append((int(hex, 16), raw))
+            except ValueError:
+                continue
+        hashes.sort(key=itemgetter(0))
+        return iter(hashes)
+
+    @staticmethod
+    def merge(*sources):
+        # k-way merge, one (hash, raw) per hash
+        # on the same hash the later source wins, same as reading them into one dict in order
+        # (heapq.merge is stable: equal hashes come out in source order)
+        last_hash = None
+        last_raw = None
+        merged = sources[0] if len(sources) == 1 else heapq.merge(*sources, key=itemgetter(0))
+        for hash, raw in merged:
+            if hash != last_hash and last_hash != None:
+                yield last_hash, last_raw
+            last_hash = hash
+            last_raw = raw
+        if last_hash != None:
+            yield last_hash, last_raw
+
+    @staticmethod
+    def write(local_file, hashes, sep):
+        # write next to it and swap: sources may still be reading local_file
+        with open(local_file + '.tmp', 'w', encoding='utf-8') as f:
+            f.writelines(f'{hash:0{sep}x} {raw}\n' for hash, raw in hashes)
+        os.replace(local_file + '.tmp', local_file)
+
+    @staticmethod
+    def missing(local_file, sep, hashtable):
+        # hashes of a {hex: raw} dict that are not in local_file
+        hashes = set()
+        for hex in hashtable:
+            try:
+                hashes.add(int(hex, 16))
+            except ValueError:
+                continue
+        with open(local_file, 'r', encoding='utf-8') as f:
+            for file_hashes, lines in HashFile.read_batches(f, sep):
+                if len(hashes) == 0:
+                    break
+                hashes.difference_update(file_hashes)
+        return hashes
+
+    @staticmethod
+    def is_sorted(local_file, sep):
+        last_hash = -1
+        with open(local_file, 'r', encoding='utf-8') as f:
+            for hashes, lines in HashFile.read_batches(f, sep):
+                if len(hashes) == 0:
+                    continue
+                if hashes[0] < last_hash or hashes != sorted(hashes):
+                    return False
+                last_hash = hashes[-1]
+        return True
+
+    @staticmethod
+    def sort(local_file, sep):
+        # external sort: sorted runs of RUN_SIZE lines in temp files, then merged
+        # later lines still win on the same hash
+        if HashFile.is_sorted(local_file, sep):
+            return False
+        runs = []
+        try:
+            hashes = []
+            for hash, raw in HashFile.read(local_file, sep):
+                hashes.append((hash, raw))
+                if len(hashes) >= HashFile.RUN_SIZE:
+                    runs.append(HashFile.write_run(hashes, sep, local_file))
+                    hashes = []
+            if len(hashes) > 0:
+                runs.append(HashFile.write_run(hashes, sep, local_file))
+            HashFile.write(local_file, HashFile.merge(*(HashFile.read_file(run, sep) for run in runs)), sep)
+        finally:
+            for run in runs:
+                run.close()
+        print(f'hash_helper: Finish: Sort: {local_file}')
+        return True
+
+    @staticmethod
+    def write_run(hashes, sep, local_file):
+        hashes.sort(key=itemgetter(0))
+        run = tempfile.TemporaryFile('w+', encoding='utf-8', dir=os.path.dirname(local_file) or '.')
+        run.writelines(f'{hash:0{sep}x} {raw}\n' for hash, raw in hashes)
+        run.seek(0)
+        return run
+
+
+class HashTable:
+    # read only {hash: raw} keyed by int, also usable as {hex: raw} (in, [], get, items)
+    # keys are sorted u64 (wad) or u32 (bin) followed by u32 offsets into a utf-8 string blob
+    # fanout[i] = number of keys with top 16 bits < i, so a lookup only binary searches a few keys
+    # about 12 bytes + name per hash, against ~150 bytes per entry of a {hex str: str} dict
+    # data is a memory mapped compiled hashes file (shared by processes through the page cache)
+    # or the same bytes in memory
+    # arrays are cast in native order, the data is little endian (x86, arm)
+    HEADER = Struct('<4sIIIQQ')
+    MAGIC = b'LHT\0'
+    VERSION = 1
+    FANOUT_SIZE = 65537
+
+    def __init__(self, path=None, data=None):
+        self.path = path
+        if path != None:
+            with open(path, 'rb') as f:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.data = data
+        magic, version, self.key_size, self.count, self.source_mtime, self.source_size = HashTable.HEADER.unpack_from(
+            data, 0)
+        if magic != HashTable.MAGIC or version != HashTable.VERSION or self.key_size not in (4, 8):
+            raise Exception(
+                f'hash_helper: Error: Read compiled hashes {path}: Wrong file signature or version.')
+        view = memoryview(data)
+        pos = HashTable.HEADER.size
+        self.fanout = view[pos:pos+HashTable.FANOUT_SIZE*4].cast('I')
+        pos += HashTable.FANOUT_SIZE*4
+        self.shift = self.key_size*8 - 16
+        self.keys_start = pos
+        self.keys = view[pos:pos+self.count*self.key_size].cast('Q' if self.key_size == 8 else 'I')
+        pos += self.count*self.key_size
+        self.offsets = view[pos:pos+(self.count+1)*4].cast('I')
+        pos += (self.count+1)*4
+        self.blob_start = pos
+
+    def __len__(self):
+        return self.count
+
+    def __reduce__(self):
+        # other processes map the same file instead of copying the table
+        if self.path != None:
+            return (HashTable, (self.path,))
+        return (HashTable, (None, bytes(self.data)))
+
+    def find_hash(self, key):
+        # position of int key in keys, -1 if not found
+        top = key >> self.shift
+        if top >= 65536:
+            return -1
+        hi = self.fanout[top+1]
+        pos = bisect_left(self.keys, key, self.fanout[top], hi)
+        if pos < hi and self.keys[pos] == key:
+            return pos
+        return -1
+
+    def find(self, hex):
+        # hex may be anything a dict lookup accepts (BINType of a field...), not found then
+        try:
+            key = int(hex, 16)
+        except (TypeError, ValueError):
+            return -1
+        return self.find_hash(key)
+
+    def raw(self, pos):
+        return self.data[self.blob_start+self.offsets[pos]:self.blob_start+self.offsets[pos+1]].decode('utf-8')
+
+    def get_hash(self, hash, default=None):
+        # lookup by int, used by WADHasher.hash_to_raw: no hex string is made
+        pos = self.find_hash(hash)
+        return self.raw(pos) if pos != -1 else default
+
+    def get_hashes(self, hashes):
+        # bulk get_hash: list of raw or None for a sequence of int hashes
+        # numpy (optional) searches all of them at once
+        if numpy != None and len(hashes) > 0:
+            keys = numpy.frombuffer(self.data, '<u8' if self.key_size == 8 else '<u4', self.count, self.keys_start)
+            hashes = numpy.asarray(hashes, dtype=numpy.uint64)
+            positions = numpy.searchsorted(keys, hashes).clip(0, max(self.count - 1, 0))
+            found = (keys[positions] == hashes) if self.count > 0 else numpy.zeros(len(hashes), dtype=bool)
+            raw = self.raw
+            return [raw(pos) if is_found else None for pos, is_found in zip(positions.tolist(), found.tolist())]
+        find_hash, raw = self.find_hash, self.raw
+        raws = []
+        for hash in hashes:
+            pos = find_hash(hash)
+            raws.append(raw(pos) if pos != -1 else None)
+        return raws
+
+    def get(self, hex, default=None):
+        pos = self.find(hex)
+        return self.raw(pos) if pos != -1 else default
+
+    def __contains__(self, hex):
+        return self.find(hex) != -1
+
+    def __getitem__(self, hex):
+        pos = self.find(hex)
+        if pos == -1:
+            raise KeyError(hex)
+        return self.raw(pos)
+
+    def items(self):
+        hex_size = self.key_size * 2
+        for pos in range(self.count):
+            yield f'{self.keys[pos]:0{hex_size}x}', self.raw(pos)
+
+    @staticmethod
+    def dump(f, hashtable, key_size, source_mtime=0, source_size=0):
+        # hashtable: {int hash: raw}
+        keys = sorted(hashtable)
+        raws = [hashtable[key].encode('utf-8') for key in keys]
+        offsets = array('I', [0])
+        offsets.extend(accumulate(len(raw) for raw in raws))
+        shift = key_size*8 - 16
+        fanout = array('I', bytes(HashTable.FANOUT_SIZE*4))
+        for key in keys:
+            fanout[(key >> shift) + 1] += 1
+        fanout = array('I', accumulate(fanout))
+        f.write(HashTable.HEADER.pack(
+            HashTable.MAGIC, HashTable.VERSION, key_size, len(keys), source_mtime, source_size))
+        f.write(fanout.tobytes())
+        f.write(array('Q' if key_size == 8 else 'I', keys).tobytes())
+        f.write(offsets.tobytes())
+        f.write(b''.join(raws))
+
+    @staticmethod
+    def replace(temp_file, path):
+        # swap a new table in, False if the old one is in use (mapped by a process on windows)
+        # the new table then waits next to it, CompiledHashes.open swaps it in later
+        try:
+            os.replace(temp_file, path)
+            return True
+        except PermissionError as e:
+            print(f'hash_helper: Warning: Swap compiled hashes: {path}: {e}')
+            return False
+
+    @staticmethod
+    def write(path, hashtable, key_size, source_mtime=0, source_size=0):
+        with open(path, 'wb') as f:
+            HashTable.dump(f, hashtable, key_size, source_mtime, source_size)
+
+    @staticmethod
+    def from_hashes(hashtable, key_size):
+        # compact in memory table from {int hash: raw}
+        f = BytesIO()
+        HashTable.dump(f, hashtable, key_size)
+        return HashTable(data=f.getvalue())
+
+    @staticmethod
+    def parse(local_file, sep):
+        # {int hash: raw} of a hashes txt, later lines win like the dict it replaces
+        hashtable = {}
+        with open(local_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    hashtable[int(line[:sep], 16)] = line[sep+1:-1]
+                except ValueError:
+                    continue
+        return hashtable
+
+
+class HashTableWriter:
+    # compiled table from a stream in ascending hash order
+    # keys, offsets and names are spilled to temp files and joined on close
+    BATCH_SIZE = 65536
+
+    def __init__(self, path, key_size):
+        self.path = path
+        self.key_size = key_size
+        self.shift = key_size*8 - 16
+        self.count = 0
+        self.offset = 0
+        self.fanout = array('I', bytes(HashTable.FANOUT_SIZE*4))
+        self.keys = array('Q' if key_size == 8 else 'I')
+        self.offsets = array('I', [0])
+        temp_dir = os.path.dirname(path) or '.'
+        self.keys_file = tempfile.TemporaryFile(dir=temp_dir)
+        self.offsets_file = tempfile.TemporaryFile(dir=temp_dir)
+        self.raws_file = tempfile.TemporaryFile(dir=temp_dir)
+
+    def add(self, hashes):
+        # hashes: [(hash, raw)]
+        fanout = self.fanout
+        shift = self.shift
+        keys = [hash for hash, raw in hashes]
+        for key in keys:
+            fanout[(key >> shift) + 1] += 1
+        raws = [raw.encode('utf-8') for hash, raw in hashes]
+        self.keys.extend(keys)
+        offsets = list(accumulate(map(len, raws), initial=self.offset))
+        self.offsets.extend(offsets[1:])
+        self.offset = offsets[-1]
+        self.raws_file.write(b''.join(raws))
+        self.count += len(keys)
+        if len(self.keys) >= HashTableWriter.BATCH_SIZE:
+            self.flush()
+
+    def feed(self, hashes):
+        # pass a stream through, adding every hash
+        hashes = iter(hashes)
+        while True:
+            batch = list(islice(hashes, HashTableWriter.BATCH_SIZE))
+            if len(batch) == 0:
+                break
+            self.add(batch)
+            yield from batch
+
+    def add_all(self, hashes):
+        for hash, raw in self.feed(hashes):
+            continue
+
+    def flush(self):
+        self.keys.tofile(self.keys_file)
+        self.offsets.tofile(self.offsets_file)
+        del self.keys[:]
+        del self.offsets[:]
+
+    def close(self, source_mtime=0, source_size=0):
+        self.flush()
+        fanout = array('I', accumulate(self.fanout))
+        with open(self.path + '.tmp', 'wb') as f:
+            f.write(HashTable.HEADER.pack(
+                HashTable.MAGIC, HashTable.VERSION, self.key_size, self.count, source_mtime, source_size))
+            f.write(fanout.tobytes())
+            for temp_file in (self.keys_file, self.offsets_file, self.raws_file):
+                temp_file.seek(0)
+                shutil.copyfileobj(temp_file, f, 1024**2*4)
+        self.discard()
+        return HashTable.replace(self.path + '.tmp', self.path)
+
+    def discard(self):
+        self.keys_file.close()
+        self.offsets_file.close()
+        self.raws_file.close()
+
+
+class CompiledHashes:
+    # compiled custom hashes, rebuilt when the custom hashes txt changes
+    # local_dir None = next to the custom hashes they are compiled from, so every hash dir has its own
+    local_dir = None
+
+    def get_local_dir():
+        if CompiledHashes.local_dir != None:
+            return CompiledHashes.local_dir
+        return f'{CustomHashes.local_dir}/compiled'
+
+    def local_file(filename):
+        return f'{CompiledHashes.get_local_dir()}/{filename}.lht'
+
+    @staticmethod
+    def is_outdated(filename, compiled_file=None):
+        local_file = CustomHashes.local_file(filename)
+        if compiled_file == None:
+            compiled_file = CompiledHashes.local_file(filename)
+        if not os.path.exists(compiled_file):
+            return True
+        stat = os.stat(local_file)
+        try:
+            with open(compiled_file, 'rb') as f:
+                magic, version, key_size, count, source_mtime, source_size = HashTable.HEADER.unpack(
+                    f.read(HashTable.HEADER.size))
+        except Exception:
+            return True
+        return magic != HashTable.MAGIC or version != HashTable.VERSION or source_mtime != stat.st_mtime_ns or source_size != stat.st_size
+
+    @staticmethod
+    def compile(filename):
+        local_file = CustomHashes.local_file(filename)
+        compiled_file = CompiledHashes.local_file(filename)
+        if not os.path.exists(local_file):
+            return False
+        Storage.unmap(filename)
+        try:
+            os.makedirs(CompiledHashes.get_local_dir(), exist_ok=True)
+            stat = os.stat(local_file)
+            sep = get_hash_separator(filename)
+            if HashFile.is_sorted(local_file, sep):
+                # stream it, the writer also swaps the file in when done
+                writer = HashTableWriter(compiled_file, sep // 2)
+                writer.add_all(HashFile.merge(HashFile.read(local_file, sep)))
+                swapped = writer.close(stat.st_mtime_ns, stat.st_size)
+            else:
+                # edited by hand, not in hash order
+                hashtable = HashTable.parse(local_file, sep)
+                # write next to it and swap, readers never see a half written file
+                HashTable.write(compiled_file + '.tmp', hashtable, sep // 2, stat.st_mtime_ns, stat.st_size)
+                swapped = HashTable.replace(compiled_file + '.tmp', compiled_file)
+            if swapped:
+                print(f'hash_helper: Finish: Compile: {compiled_file}')
+            return swapped
+        except Exception as e:
+            print(f'hash_helper: Warning: Compile: {compiled_file}: {e}')
+            return False
+
+    @staticmethod
+    def writer(filename):
+        # None if the compiled table can not be written, the txt is still updated
+        try:
+            os.makedirs(CompiledHashes.get_local_dir(), exist_ok=True)
+            return HashTableWriter(CompiledHashes.local_file(filename), get_hash_separator(filename) // 2)
+        except Exception as e:
+            print(f'hash_helper: Warning: Compile: {CompiledHashes.local_file(filename)}: {e}')
+            return None
+
+    @staticmethod
+    def open(filename, compile=True):
+        # compiled table of custom hashes, compiled first if missing or outdated
+        # None if it can not be compiled or swapped in, caller falls back to the txt
+        # compile False: None if missing or outdated, many processes do not build the same table
+        if CompiledHashes.is_outdated(filename):
+            if not compile:
+                return None
+            compiled_file = CompiledHashes.local_file(filename)
+            if not CompiledHashes.is_outdated(filename, compiled_file + '.tmp'):
+                # compiled while the old table was in use, swap it in now
+                if not HashTable.replace(compiled_file + '.tmp', compiled_file):
+                    return None
+            elif not CompiledHashes.compile(filename):
+                return None
+        try:
+            return HashTable(CompiledHashes.local_file(filename))
+        except Exception as e:
+            print(f'hash_helper: Warning: Open: {CompiledHashes.local_file(filename)}: {e}')
+            return None
+
 def init():
     # load setting first
     CDTBHashes.local_dir = setting.get('CDTBHashes.local_dir', CDTBHashes.local_dir)
+    CDTBHashes.remote_dir = setting.get('CDTBHashes.remote_dir', CDTBHashes.remote_dir)
     ExtractedHashes.local_dir = setting.get('ExtractedHashes.local_dir', ExtractedHashes.local_dir)
     CustomHashes.local_dir = setting.get('CustomHashes.local_dir', CustomHashes.local_dir)
+    CompiledHashes.local_dir = setting.get('CompiledHashes.local_dir', CompiledHashes.local_dir)
     # ensure folder
     os.makedirs(CDTBHashes.local_dir, exist_ok=True)
     os.makedirs(ExtractedHashes.local_dir, exist_ok=True)
     os.makedirs(CustomHashes.local_dir, exist_ok=True)
+    os.makedirs(CompiledHashes.get_local_dir(), exist_ok=True)
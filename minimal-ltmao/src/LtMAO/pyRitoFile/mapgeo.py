@@ -369,7 +369,7 @@ class MAPGEO:
                 if self.version >= 13:
                     bs.pad(1)  # layer
                 index_buffer_size, = bs.read_u32() # size = byte count
-                index_buffers[i] = bs.read_u16(index_buffer_size // 2)
+                index_buffers[i] = bs.read_array('H', index_buffer_size // 2)
 
             # read models
             unpacked_vertex_buffers = [None]*vertex_buffer_count # for skip reading same vertex buffer
@@ -529,7 +529,7 @@ class MAPGEO:
                 vertex_count, index_count = bs.read_u32(2)
                 if not bucket_grid.is_disabled:
                     bucket_grid.vertices = bs.read_vec3(vertex_count)
-                    bucket_grid.indices = bs.read_u16(index_count)
+                    bucket_grid.indices = bs.read_array('H', index_count)
                     bucket_grid.buckets = [[MAPGEOBucket() for j in range(bucket_count)] for i in range(bucket_count)]
                     for bucket_row in bucket_grid.buckets:
                         for bucket in bucket_row:
@@ -723,7 +723,7 @@ class MAPGEO:
             for layer, indices in index_buffers:
                 bs.write_u8(layer.value)
                 bs.write_u32(len(indices) * 2)
-                bs.write_u16(*indices)
+                bs.write_array(indices, 'H')
 
             # model
             bs.write_u32(len(self.models))
@@ -820,7 +820,7 @@ class MAPGEO:
                         bs.write_u32(len(bucket_grid.indices))
                         if not bucket_grid.is_disabled:
                             bs.write_vec3(*bucket_grid.vertices)
-                            bs.write_u16(*bucket_grid.indices)
+                            bs.write_array(bucket_grid.indices, 'H')
                             for bucket_row in bucket_grid.buckets:
                                 for bucket in bucket_row:
                                     bs.write_f32(bucket.max_stickout_x, bucket.max_stickout_z)
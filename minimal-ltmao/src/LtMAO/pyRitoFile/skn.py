@@ -1,4 +1,5 @@
-from .stream import BytesStream
+from .stream import BytesStream, numpy
+from array import array
 from .helper import FNV1a
 from enum import Enum
 
@@ -128,13 +129,16 @@ class SKN:
                 raise Exception(f'pyRitoFile: Error: Read SKN {path}: Bad indices data: {index_count}')
 
             # read unique indices
-            indices = bs.read_u16(index_count)
-            self.indices = []
-            for i in range(0, index_count, 3):
-                if indices[i] == indices[i+1] or indices[i+1] == indices[i+2] or indices[i+2] == indices[i]:
-                    continue
-                self.indices.extend(
-                    (indices[i], indices[i+1], indices[i+2]))
+            indices = bs.read_array('H', index_count)
+            if numpy != None:
+                faces = indices.reshape(-1, 3)
+                self.indices = faces[(faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & (faces[:, 2] != faces[:, 0])].ravel()
+            else:
+                self.indices = array('H')
+                for i in range(0, index_count, 3):
+                    if indices[i] == indices[i+1] or indices[i+1] == indices[i+2] or indices[i+2] == indices[i]:
+                        continue
+                    self.indices.extend(indices[i:i+3])
 
             # read vertices
             self.vertices = [SKNVertex() for i in range(vertex_count)]
@@ -176,7 +180,7 @@ class SKN:
                 bs.write_vec3(self.bounding_sphere[0])
                 bs.write_f32(self.bounding_sphere[1])
              # indices vertices
-            bs.write_u16(*self.indices)
+            bs.write_array(self.indices, 'H')
             for vertex in self.vertices:
                 bs.write_vec3(vertex.position)
                 bs.write_u8(*vertex.influences)
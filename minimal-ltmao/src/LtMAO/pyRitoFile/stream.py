@@ -1,7 +1,86 @@
 from io import BytesIO, StringIO
 from struct import Struct
+from mmap import mmap as MemoryMap, ACCESS_READ
+from array import array
+import os, sys
 from .structs import Vector, Quaternion, Matrix4
 
+class StructCache(dict):
+    # precompiled little endian structs of one type, keyed by count
+    # huge counts (index/vertex arrays) are unique per file, dont keep them
+    MAX_COUNT = 64
+
+    def __init__(self, type_char):
+        self.type_char = type_char
+
+    def __missing__(self, count):
+        s = Struct(f'<{count}{self.type_char}')
+        if count <= StructCache.MAX_COUNT:
+            self[count] = s
+        return s
+
+STRUCT_BOOL = StructCache('?')
+STRUCT_I8 = StructCache('b')
+STRUCT_U8 = StructCache('B')
+STRUCT_I16 = StructCache('h')
+STRUCT_U16 = StructCache('H')
+STRUCT_I32 = StructCache('i')
+STRUCT_U32 = StructCache('I')
+STRUCT_I64 = StructCache('q')
+STRUCT_U64 = StructCache('Q')
+STRUCT_F32 = StructCache('f')
+STRUCT_F64 = StructCache('d')
+
+# numpy is optional, typed arrays fall back to array.array without it
+try:
+    import numpy
+except:
+    numpy = None
+
+# struct type char -> little endian numpy dtype, item size
+ARRAY_DTYPES = {
+    'b': ('<i1', 1),
+    'B': ('<u1', 1),
+    'h': ('<i2', 2),
+    'H': ('<u2', 2),
+    'i': ('<i4', 4),
+    'I': ('<u4', 4),
+    'q': ('<i8', 8),
+    'Q': ('<u8', 8),
+    'f': ('<f4', 4),
+    'd': ('<f8', 8),
+}
+
+def array_from_buffer(dtype, buffer, count, offset=0):
+    # numpy: view over buffer, read only if buffer is read only
+    # array.array: copy of the values
+    numpy_dtype, size = ARRAY_DTYPES[dtype]
+    if numpy != None:
+        return numpy.frombuffer(buffer, numpy_dtype, count, offset)
+    data = memoryview(buffer)[offset:offset+count*size]
+    try:
+        if len(data) != count*size:
+            raise ValueError(f'pyRitoFile: Error: Read array: Need {count*size} bytes, got {len(data)}.')
+        arr = array(dtype)
+        arr.frombytes(data)
+    finally:
+        data.release()
+    if sys.byteorder == 'big':
+        arr.byteswap()
+    return arr
+
+def array_to_bytes(arr, dtype=None):
+    # arr: numpy array, array.array or list of numbers (list needs dtype)
+    if numpy != None:
+        arr = numpy.asarray(arr, ARRAY_DTYPES[dtype][0] if dtype != None else None)
+        return arr.astype(arr.dtype.newbyteorder('<'), copy=False).tobytes()
+    if dtype != None and not (isinstance(arr, array) and arr.typecode == dtype):
+        arr = array(dtype, arr)
+    if sys.byteorder == 'big':
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    return arr.tobytes()
+
 class StringStream:
     @staticmethod
     def reader(path, raw=False):
@@ -16,9 +95,16 @@ class StringStream:
         return StringIO(path.decode('utf-8')) if raw else open(path, 'r+', encoding='utf-8')
 
 class BytesStream:
+    # files from this size are memory mapped when reader() is left on auto
+    MMAP_MIN_SIZE = 1024**2*16
+
     @staticmethod
-    def reader(path, raw=False):
-        return BytesStream(BytesIO(path)) if raw else BytesStream(open(path, 'rb'))
+    def reader(path, raw=False, mmap=None):
+        if raw:
+            return BufferReader(path)
+        if mmap == None:
+            mmap = os.path.getsize(path) >= BytesStream.MMAP_MIN_SIZE
+        return BufferReader.mapped(path) if mmap else BytesStream(open(path, 'rb'))
         
     @staticmethod
     def writer(path, raw=False):
@@ -69,57 +155,60 @@ class BytesStream:
     def read(self, length):
         return self.stream.read(length)
 
+    def read_view(self, length):
+        return memoryview(self.stream.read(length))
+
     def read_b(self, count=1):
-        return Struct(f'<{count}?').unpack(self.stream.read(count))
+        return STRUCT_BOOL[count].unpack(self.stream.read(count))
 
     def read_i8(self, count=1):
-        return Struct(f'<{count}b').unpack(self.stream.read(count))
+        return STRUCT_I8[count].unpack(self.stream.read(count))
 
     def read_u8(self, count=1):
-        return Struct(f'<{count}B').unpack(self.stream.read(count))
+        return STRUCT_U8[count].unpack(self.stream.read(count))
 
     def read_i16(self, count=1):
-        return Struct(f'<{count}h').unpack(self.stream.read(count*2))
+        return STRUCT_I16[count].unpack(self.stream.read(count*2))
 
     def read_u16(self, count=1):
-        return Struct(f'<{count}H').unpack(self.stream.read(count*2))
+        return STRUCT_U16[count].unpack(self.stream.read(count*2))
 
     def read_i32(self, count=1):
-        return Struct(f'<{count}i').unpack(self.stream.read(count*4))
+        return STRUCT_I32[count].unpack(self.stream.read(count*4))
 
     def read_u32(self, count=1):
-        return Struct(f'<{count}I').unpack(self.stream.read(count*4))
+        return STRUCT_U32[count].unpack(self.stream.read(count*4))
 
     def read_i64(self, count=1):
-        return Struct(f'<{count}q').unpack(self.stream.read(count*8))
+        return STRUCT_I64[count].unpack(self.stream.read(count*8))
 
     def read_u64(self, count=1):
-        return Struct(f'<{count}Q').unpack(self.stream.read(count*8))
+        return STRUCT_U64[count].unpack(self.stream.read(count*8))
 
     def read_f32(self, count=1):
-        return Struct(f'<{count}f').unpack(self.stream.read(count*4))
+        return STRUCT_F32[count].unpack(self.stream.read(count*4))
 
     def read_f64(self, count=1):
-        return Struct(f'<{count}d').unpack(self.stream.read(count*8))
+        return STRUCT_F64[count].unpack(self.stream.read(count*8))
 
     def read_vec2(self, count=1):
-        floats = Struct(f'<{count*2}f').unpack(self.stream.read(count*8))
+        floats = STRUCT_F32[count*2].unpack(self.stream.read(count*8))
         return [Vector(floats[i], floats[i+1]) for i in range(0, len(floats), 2)]
 
     def read_vec3(self, count=1):
-        floats = Struct(f'<{count*3}f').unpack(self.stream.read(count*12))
+        floats = STRUCT_F32[count*3].unpack(self.stream.read(count*12))
         return [Vector(floats[i], floats[i+1], floats[i+2]) for i in range(0, len(floats), 3)]
 
     def read_vec4(self, count=1):
-        floats = Struct(f'<{count*4}f').unpack(self.stream.read(count*16))
+        floats = STRUCT_F32[count*4].unpack(self.stream.read(count*16))
         return [Vector(floats[i], floats[i+1], floats[i+2], floats[i+3]) for i in range(0, len(floats), 4)]
 
     def read_quat(self, count=1):
-        floats = Struct(f'<{count*4}f').unpack(self.stream.read(count*16))
+        floats = STRUCT_F32[count*4].unpack(self.stream.read(count*16))
         return [Quaternion(floats[i], floats[i+1], floats[i+2], floats[i+3]) for i in range(0, len(floats), 4)]
 
     def read_mtx4(self):
-        return Matrix4(*Struct('16f').unpack(self.stream.read(64))),
+        return Matrix4(*STRUCT_F32[16].unpack(self.stream.read(64))),
         
     def read_s(self, length, encoding='ascii'):
         return self.stream.read(length).decode(encoding),
@@ -128,10 +217,10 @@ class BytesStream:
         return bytes(b for b in self.stream.read(length) if b != 0).decode(encoding),
 
     def read_s_sized16(self, encoding='ascii'):
-        return self.stream.read(Struct('H').unpack(self.stream.read(2))[0]).decode(encoding),
+        return self.stream.read(STRUCT_U16[1].unpack(self.stream.read(2))[0]).decode(encoding),
 
     def read_s_sized32(self, encoding='ascii'):
-        return self.stream.read(Struct('I').unpack(self.stream.read(4))[0]).decode(encoding),
+        return self.stream.read(STRUCT_U32[1].unpack(self.stream.read(4))[0]).decode(encoding),
 
     def read_c_until0(self):
         s = ''
@@ -149,6 +238,9 @@ class BytesStream:
             self.pad(1)
         return s,
 
+    def read_array(self, dtype, count):
+        return array_from_buffer(dtype, self.stream.read(count*ARRAY_DTYPES[dtype][1]), count)
+
     # write
 
     def write_fmt(self, fmt, *values):
@@ -158,54 +250,54 @@ class BytesStream:
         self.stream.write(values)
 
     def write_b(self, *values):
-        self.stream.write(Struct(f'<{len(values)}?').pack(*values))
+        self.stream.write(STRUCT_BOOL[len(values)].pack(*values))
 
     def write_i8(self, *values):
-        self.stream.write(Struct(f'<{len(values)}b').pack(*values))
+        self.stream.write(STRUCT_I8[len(values)].pack(*values))
 
     def write_u8(self, *values):
-        self.stream.write(Struct(f'<{len(values)}B').pack(*values))
+        self.stream.write(STRUCT_U8[len(values)].pack(*values))
 
     def write_i16(self, *values):
-        self.stream.write(Struct(f'<{len(values)}h').pack(*values))
+        self.stream.write(STRUCT_I16[len(values)].pack(*values))
 
     def write_u16(self, *values):
-        self.stream.write(Struct(f'<{len(values)}H').pack(*values))
+        self.stream.write(STRUCT_U16[len(values)].pack(*values))
 
     def write_i32(self, *values):
-        self.stream.write(Struct(f'<{len(values)}i').pack(*values))
+        self.stream.write(STRUCT_I32[len(values)].pack(*values))
 
     def write_u32(self, *values):
-        self.stream.write(Struct(f'<{len(values)}I').pack(*values))
+        self.stream.write(STRUCT_U32[len(values)].pack(*values))
 
     def write_i64(self, *values):
-        self.stream.write(Struct(f'<{len(values)}q').pack(*values))
+        self.stream.write(STRUCT_I64[len(values)].pack(*values))
 
     def write_u64(self, *values):
-        self.stream.write(Struct(f'<{len(values)}Q').pack(*values))
+        self.stream.write(STRUCT_U64[len(values)].pack(*values))
 
     def write_f32(self, *values):
-        self.stream.write(Struct(f'<{len(values)}f').pack(*values))
+        self.stream.write(STRUCT_F32[len(values)].pack(*values))
 
     def write_vec2(self, *values):
         floats = [f for vec in values for f in vec]
-        self.stream.write(Struct(f'<{len(floats)}f').pack(*floats))
+        self.stream.write(STRUCT_F32[len(floats)].pack(*floats))
 
     def write_vec3(self, *values):
         floats = [f for vec in values for f in vec]
-        self.stream.write(Struct(f'<{len(floats)}f').pack(*floats))
+        self.stream.write(STRUCT_F32[len(floats)].pack(*floats))
 
     def write_vec4(self, *values):
         floats = [f for vec in values for f in vec]
-        self.stream.write(Struct(f'<{len(floats)}f').pack(*floats))
+        self.stream.write(STRUCT_F32[len(floats)].pack(*floats))
 
     def write_quat(self, *values):
         floats = [f for quat in values for f in quat]
-        self.stream.write(Struct(f'<{len(floats)}f').pack(*floats))
+        self.stream.write(STRUCT_F32[len(floats)].pack(*floats))
 
     def write_mtx4(self, mtx4):
         floats = [f for f in mtx4]
-        self.stream.write(Struct('16f').pack(*floats))
+        self.stream.write(STRUCT_F32[16].pack(*floats))
     
     def write_s(self, value, encoding='ascii'):
         self.stream.write(value.encode(encoding))
@@ -218,17 +310,219 @@ class BytesStream:
 
     def write_s_sized16(self, value, encoding='ascii'):
         v = value.encode(encoding)
-        self.stream.write(Struct('H').pack(len(v)))
+        self.stream.write(STRUCT_U16[1].pack(len(v)))
         self.stream.write(v)
 
     def write_s_sized32(self, value, encoding='ascii'):
         v = value.encode(encoding)
-        self.stream.write(Struct('I').pack(len(v)))
+        self.stream.write(STRUCT_U32[1].pack(len(v)))
         self.stream.write(v)
 
+    def write_array(self, arr, dtype=None):
+        self.stream.write(array_to_bytes(arr, dtype))
+
     def write_c_sep_0(self, value):
         s = b''
         for c in value.encode('ascii'):
             s += bytes([c])
             s += b'\x00'
         self.stream.write(s)
+
+
+class BufferReader:
+    # read only stream over bytes, bytearray, memoryview or mmap
+    # values are decoded straight from the buffer at a moving offset with unpack_from
+    # same read api as BytesStream so every reader works with it unchanged
+    @staticmethod
+    def mapped(path):
+        with open(path, 'rb') as f:
+            # empty file can not be mapped
+            if os.fstat(f.fileno()).st_size == 0:
+                return BufferReader(b'')
+            return BufferReader(MemoryMap(f.fileno(), 0, access=ACCESS_READ), owned=True)
+
+    def __init__(self, buffer, owned=False):
+        self.buffer = buffer
+        self.owned = owned
+        self.offset = 0
+        self.size = len(buffer)
+        # bytes slices decode fastest, memoryview slices need str()
+        self.decode = bytes.decode if isinstance(buffer[0:0], bytes) else str
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    # stream
+    def tell(self):
+        return self.offset
+
+    def seek(self, pos, mode=0):
+        if mode == 1:
+            pos += self.offset
+        elif mode == 2:
+            pos += self.size
+        self.offset = pos
+
+    def pad(self, length):
+        self.offset += length
+
+    def end(self):
+        return self.size
+
+    def close(self):
+        # only close what we opened (mmap), caller buffers are just dropped
+        if self.owned:
+            try:
+                self.buffer.close()
+            except BufferError:
+                # a view from read_view() is still alive
+                # the map is freed when that view is released
+                pass
+        self.buffer = None
+
+    def raw(self):
+        self.offset = self.size
+        return bytes(self.buffer)
+
+    # read
+
+    def read_fmt(self, fmt, fmt_size):
+        offset = self.offset
+        self.offset = offset + fmt_size
+        return Struct(fmt).unpack_from(self.buffer, offset)
+
+    def read(self, length=-1):
+        offset = self.offset
+        end = self.size if length < 0 else min(offset + length, self.size)
+        self.offset = max(end, offset)
+        return bytes(self.buffer[offset:end])
+
+    def read_view(self, length):
+        # zero copy slice of the buffer, release it after use
+        offset = self.offset
+        end = min(offset + length, self.size)
+        self.offset = max(end, offset)
+        return memoryview(self.buffer)[offset:end]
+
+    def read_b(self, count=1):
+        offset = self.offset
+        self.offset = offset + count
+        return STRUCT_BOOL[count].unpack_from(self.buffer, offset)
+
+    def read_i8(self, count=1):
+        offset = self.offset
+        self.offset = offset + count
+        return STRUCT_I8[count].unpack_from(self.buffer, offset)
+
+    def read_u8(self, count=1):
+        offset = self.offset
+        self.offset = offset + count
+        return STRUCT_U8[count].unpack_from(self.buffer, offset)
+
+    def read_i16(self, count=1):
+        offset = self.offset
+        self.offset = offset + count*2
+        return STRUCT_I16[count].unpack_from(self.buffer, offset)
+
+    def read_u16(self, count=1):
+        offset = self.offset
+        self.offset = offset + count*2
+        return STRUCT_U16[count].unpack_from(self.buffer, offset)
+
+    def read_i32(self, count=1):
+        offset = self.offset
+        self.offset = offset + count*4
+        return STRUCT_I32[count].unpack_from(self.buffer, offset)
+
+    def read_u32(self, count=1):
+        offset = self.offset
+        self.offset = offset + count*4
+        return STRUCT_U32[count].unpack_from(self.buffer, offset)
+
+    def read_i64(self, count=1):
+        offset = self.offset
+        self.offset = offset + count*8
+        return STRUCT_I64[count].unpack_from(self.buffer, offset)
+
+    def read_u64(self, count=1):
+        offset = self.offset
+        self.offset = offset + count*8
+        return STRUCT_U64[count].unpack_from(self.buffer, offset)
+
+    def read_f32(self, count=1):
+        offset = self.offset
+        self.offset = offset + count*4
+        return STRUCT_F32[count].unpack_from(self.buffer, offset)
+
+    def read_f64(self, count=1):
+        offset = self.offset
+        self.offset = offset + count*8
+        return STRUCT_F64[count].unpack_from(self.buffer, offset)
+
+    def read_vec2(self, count=1):
+        floats = self.read_f32(count*2)
+        return [Vector(floats[i], floats[i+1]) for i in range(0, len(floats), 2)]
+
+    def read_vec3(self, count=1):
+        floats = self.read_f32(count*3)
+        return [Vector(floats[i], floats[i+1], floats[i+2]) for i in range(0, len(floats), 3)]
+
+    def read_vec4(self, count=1):
+        floats = self.read_f32(count*4)
+        return [Vector(floats[i], floats[i+1], floats[i+2], floats[i+3]) for i in range(0, len(floats), 4)]
+
+    def read_quat(self, count=1):
+        floats = self.read_f32(count*4)
+        return [Quaternion(floats[i], floats[i+1], floats[i+2], floats[i+3]) for i in range(0, len(floats), 4)]
+
+    def read_mtx4(self):
+        return Matrix4(*self.read_f32(16)),
+
+    def read_s(self, length, encoding='ascii'):
+        offset = self.offset
+        self.offset = offset + length
+        return self.decode(self.buffer[offset:offset+length], encoding),
+
+    def read_s_padded(self, length, encoding='ascii'):
+        offset = self.offset
+        self.offset = offset + length
+        return bytes(self.buffer[offset:offset+length]).replace(b'\x00', b'').decode(encoding),
+
+    def read_s_sized16(self, encoding='ascii'):
+        offset = self.offset
+        length, = STRUCT_U16[1].unpack_from(self.buffer, offset)
+        offset += 2
+        self.offset = offset + length
+        return self.decode(self.buffer[offset:offset+length], encoding),
+
+    def read_s_sized32(self, encoding='ascii'):
+        offset = self.offset
+        length, = STRUCT_U32[1].unpack_from(self.buffer, offset)
+        offset += 4
+        self.offset = offset + length
+        return self.decode(self.buffer[offset:offset+length], encoding),
+
+    def read_c_until0(self):
+        buffer, offset = self.buffer, self.offset
+        end = offset
+        while buffer[end] != 0:
+            end += 1
+        self.offset = end + 1
+        return self.decode(buffer[offset:end], 'latin-1'),
+
+    def read_c_sep_0(self, length):
+        offset = self.offset
+        self.offset = offset + length*2
+        return bytes(self.buffer[offset:offset+length*2:2]).decode('latin-1'),
+
+    def read_array(self, dtype, count):
+        offset = self.offset
+        self.offset = offset + count*ARRAY_DTYPES[dtype][1]
+        arr = array_from_buffer(dtype, self.buffer, count, offset)
+        # a view into our own map would keep it open (and the file locked), copy it out
+        if self.owned and numpy != None:
+            arr = arr.copy()
+        return arr
@@ -1,6 +1,11 @@
-from .stream import BytesStream
+from .stream import BytesStream, BufferReader
 from enum import Enum
-import gzip
+from struct import Struct
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from threading import Lock
+import gzip, zlib, mmap
 
 # not safe because external modules
 try: 
@@ -52,20 +57,67 @@ class WADExtensioner:
         bytes.fromhex('7B 0A 20 20'): 'json',
     }
 
+    # signatures grouped by their first 2 bytes, same order as above inside a group
+    # so a guess only compares the few signatures that can match
+    prefix_to_signatures = {}
+    for signature, extension in signature_to_extension.items():
+        prefix_to_signatures.setdefault(signature[:2], []).append((signature, extension))
+    del signature, extension
+    # extensions grouped by their last 2 characters, same order as above inside a group
+    # so get_extension only compares the few extensions a path can end with
+    suffix_to_extensions = {}
+    for extension in signature_to_extension.values():
+        suffix_to_extensions.setdefault(extension[-2:], []).append(extension)
+    del extension
+    # bytes needed from the start of a file to guess its extension
+    SNIFF_SIZE = max(len(signature) for signature in signature_to_extension)
+
     @staticmethod
     def guess_extension(data):
         if data[4:8] == bytes.fromhex('C3 4F FD 22'):
             return 'skl'
         else:
-            for signature, extension in WADExtensioner.signature_to_extension.items():
+            for signature, extension in WADExtensioner.prefix_to_signatures.get(bytes(data[:2]), ()):
                 if data.startswith(signature):
                     return extension
 
+    @staticmethod
+    def decompress_head(decompressor, raw, size):
+        # decompress at most size bytes from the start of raw
+        # input is fed in growing pieces, so only the first block(s) are decoded
+        data = b''
+        pos, step = 0, 4096
+        while len(data) < size and pos < len(raw) and not decompressor.eof:
+            data += decompressor.decompress(raw[pos:pos+step], size - len(data))
+            pos += step
+            step *= 2
+        return data
+
+    @staticmethod
+    def sniff_extension(compression_type, raw):
+        # guess extension of a chunk from its raw (compressed) bytes
+        size = WADExtensioner.SNIFF_SIZE
+        if compression_type == WADCompressionType.Raw:
+            head = bytes(raw[:size])
+        elif compression_type == WADCompressionType.Gzip:
+            head = WADExtensioner.decompress_head(zlib.decompressobj(16 + zlib.MAX_WBITS), raw, size)
+        elif compression_type == WADCompressionType.Satellite:
+            # Satellite is not supported
+            return None
+        elif compression_type == WADCompressionType.Zstd:
+            head = WADExtensioner.decompress_head(pyzstd.ZstdDecompressor(), raw, size)
+        elif compression_type == WADCompressionType.ZstdChunked:
+            if raw[:4] == b'\x28\xb5\x2f\xfd':
+                head = WADExtensioner.decompress_head(pyzstd.ZstdDecompressor(), raw, size)
+            else:
+                head = bytes(raw[:size])
+        return WADExtensioner.guess_extension(head)
+
     @staticmethod
     def get_extension(path):
         if path.endswith('.wad.client'):
             return 'wad'
-        for _, extension in WADExtensioner.signature_to_extension.items():
+        for extension in WADExtensioner.suffix_to_extensions.get(path[-2:], ()):
             if path.endswith(extension):
                 return extension
             
@@ -77,10 +129,55 @@ class WADHasher:
     )
     @staticmethod
     def hex_to_raw(hashtables, hex):
+        # tables are dicts or compiled tables of hash_helper, one lookup each
         for table_name in reversed(WADHasher.HASHTABLE_NAMES):
-            if table_name in hashtables and hex in hashtables[table_name]:
-                return hashtables[table_name][hex]
+            hashtable = hashtables.get(table_name)
+            if hashtable != None:
+                raw = hashtable.get(hex)
+                if raw != None:
+                    return raw
         return hex
+
+    @staticmethod
+    def hash_to_raw(hashtables, hash):
+        # same as hex_to_raw(hashtables, hash_to_hex(hash)) but looked up by int:
+        # tables with get_hash (hash_helper.HashTable) need no hex string,
+        # it is only made for plain {hex: raw} dicts or when the hash is not found
+        hex = None
+        for table_name in reversed(WADHasher.HASHTABLE_NAMES):
+            hashtable = hashtables.get(table_name)
+            if not hashtable:
+                continue
+            get_hash = getattr(hashtable, 'get_hash', None)
+            if get_hash != None:
+                raw = get_hash(hash)
+            else:
+                if hex == None:
+                    hex = f'{hash:016x}'
+                raw = hashtable.get(hex)
+            if raw != None:
+                return raw
+        return hex if hex != None else f'{hash:016x}'
+
+    @staticmethod
+    def hashes_to_raws(hashtables, hashes):
+        # hash_to_raw of many int hashes, tables with get_hashes look them up in one call
+        raws = [None] * len(hashes)
+        for table_name in reversed(WADHasher.HASHTABLE_NAMES):
+            hashtable = hashtables.get(table_name)
+            if not hashtable:
+                continue
+            missing = [i for i, raw in enumerate(raws) if raw == None]
+            if len(missing) == 0:
+                break
+            get_hashes = getattr(hashtable, 'get_hashes', None)
+            if get_hashes != None:
+                found = get_hashes([hashes[i] for i in missing])
+            else:
+                found = [hashtable.get(f'{hashes[i]:016x}') for i in missing]
+            for i, raw in zip(missing, found):
+                raws[i] = raw
+        return [raw if raw != None else f'{hash:016x}' for raw, hash in zip(raws, hashes)]
     
     @staticmethod
     def raw_to_hex(raw):
@@ -124,6 +221,8 @@ class WADChunk:
         'duplicated', 'subchunk_start', 'subchunk_count',
         'checksum', 'data', 'extension'
     )
+    # chunks bigger than this are streamed between file and wad in pieces of this size
+    BUFFER_SIZE = 1024**2*4
 
     def __init__(self, id=None, hash=None, offset=None, compressed_size=None, decompressed_size=None, compression_type=None, duplicated=None, subchunk_start=None, subchunk_count=None, checksum=None, data=None, extension=None):
         self.id = id
@@ -158,14 +257,37 @@ class WADChunk:
         return chunk
 
     def free_data(self):
+        # data can be a temp file of a streamed compress
+        if hasattr(self.data, 'close'):
+            self.data.close()
         self.data = None
 
     def read_data(self, bs):
         # read data and decompress
+        # raw is a view into the stream buffer (zero copy when bs is memory mapped)
         bs.seek(self.offset)
-        raw = bs.read(self.compressed_size)
+        raw = bs.read_view(self.compressed_size)
+        try:
+            self.decompress_data(raw)
+        finally:
+            raw.release()
+
+    def sniff_extension(self, bs):
+        # guess extension from the first bytes only, the chunk is not fully decompressed
+        if self.extension == None:
+            bs.seek(self.offset)
+            raw = bs.read_view(self.compressed_size)
+            try:
+                self.extension = WADExtensioner.sniff_extension(self.compression_type, raw)
+            finally:
+                raw.release()
+        return self.extension
+
+    def decompress_data(self, raw):
+        # decompress already read chunk bytes
+        # split from read_data so threads can decompress while one reader owns the stream
         if self.compression_type == WADCompressionType.Raw:
-            self.data = raw
+            self.data = bytes(raw)
         elif self.compression_type == WADCompressionType.Gzip:
             self.data = gzip.decompress(raw)
         elif self.compression_type == WADCompressionType.Satellite:
@@ -177,41 +299,135 @@ class WADChunk:
             if raw[:4] == b'\x28\xb5\x2f\xfd':
                 self.data = pyzstd.decompress(raw)
             else:
-                self.data = raw
+                self.data = bytes(raw)
         # guess extension
         if self.extension == None:
             self.extension = WADExtensioner.guess_extension(self.data)
 
-    def write_data(self, bs, chunk_id, chunk_hash, chunk_data, *, previous_chunks=None):
-        self.hash = chunk_hash
+    def decompress_to_file(self, raw, f, buffer_size=None):
+        # decompress already read chunk bytes into file f, buffer_size bytes at a time
+        # memory use stays flat instead of holding the whole decompressed chunk
+        if buffer_size == None:
+            buffer_size = WADChunk.BUFFER_SIZE
+        if self.extension == None:
+            self.extension = WADExtensioner.sniff_extension(self.compression_type, raw)
+        if self.compression_type == WADCompressionType.Raw or (self.compression_type == WADCompressionType.ZstdChunked and raw[:4] != b'\x28\xb5\x2f\xfd'):
+            for pos in range(0, len(raw), buffer_size):
+                f.write(raw[pos:pos+buffer_size])
+        elif self.compression_type == WADCompressionType.Gzip:
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            for pos in range(0, len(raw), buffer_size):
+                f.write(decompressor.decompress(raw[pos:pos+buffer_size], buffer_size))
+                while decompressor.unconsumed_tail:
+                    f.write(decompressor.decompress(decompressor.unconsumed_tail, buffer_size))
+            f.write(decompressor.flush())
+        elif self.compression_type == WADCompressionType.Satellite:
+            # Satellite is not supported
+            return
+        elif self.compression_type in (WADCompressionType.Zstd, WADCompressionType.ZstdChunked):
+            # endless: chunked data is many zstd frames back to back
+            decompressor = pyzstd.EndlessZstdDecompressor()
+            pos = 0
+            while True:
+                if decompressor.needs_input:
+                    if pos >= len(raw):
+                        break
+                    data = raw[pos:pos+buffer_size]
+                    pos += buffer_size
+                else:
+                    data = b''
+                f.write(decompressor.decompress(data, buffer_size))
+            if not decompressor.at_frame_edge:
+                raise Exception(
+                    f'pyRitoFile: Error: Read WAD chunk {self.hash}: Zstd data is cut off.')
+
+    def compress_data(self, chunk_data, level=None):
+        # compress file bytes into data, level None = zstd default level
+        # split from write_data so threads can compress while one writer owns the stream
         if self.extension in ('bnk', 'wpk'):
             self.data = chunk_data
             self.compression_type = WADCompressionType.Raw
         else:
-            self.data = pyzstd.compress(chunk_data)
+            self.data = pyzstd.compress(chunk_data, level)
             self.compression_type = WADCompressionType.Zstd
         self.compressed_size = len(self.data)
         self.decompressed_size = len(chunk_data)
         self.checksum = xxh3_64(self.data).intdigest()
+
+    def compress_file(self, f, out, level=None, buffer_size=None):
+        # compress file f into file out, same bytes as compress_data
+        # out becomes data, WADWriter copies it to the wad
+        # return xxh3 of the uncompressed file data
+        if buffer_size == None:
+            buffer_size = WADChunk.BUFFER_SIZE
+        f.seek(0, 2)
+        size = f.tell()
+        f.seek(0)
+        checksum = xxh3_64()
+        if self.extension in ('bnk', 'wpk'):
+            # raw: copied buffer_size bytes at a time
+            self.compression_type = WADCompressionType.Raw
+            content_hash = xxh3_64()
+            while True:
+                data = f.read(buffer_size)
+                if len(data) == 0:
+                    break
+                content_hash.update(data)
+                checksum.update(data)
+                out.write(data)
+            content_hash = content_hash.intdigest()
+            compressed_size = size
+        else:
+            # one shot over the mapped file: a streamed zstd frame differs from pyzstd.compress
+            # and the chunk bytes must not depend on how big the file is
+            self.compression_type = WADCompressionType.Zstd
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                content_hash = xxh3_64(mapped).intdigest()
+                data = pyzstd.compress(mapped, level)
+            checksum.update(data)
+            # spooled out is on disk past buffer_size, the compressed bytes are not kept
+            out.write(data)
+            compressed_size = len(data)
+            del data
+        self.data = out
+        self.compressed_size = compressed_size
+        self.decompressed_size = size
+        self.checksum = checksum.intdigest()
+        return content_hash
+
+    def write_data(self, bs, chunk_id, chunk_hash, chunk_data, *, previous_chunks=None, chunk_dupes=None, level=None):
+        self.compress_data(chunk_data, level)
+        self.write_compressed_data(bs, chunk_id, chunk_hash, previous_chunks=previous_chunks, chunk_dupes=chunk_dupes)
+
+    def write_compressed_data(self, bs, chunk_id, chunk_hash, *, previous_chunks=None, chunk_dupes=None):
+        # data must be compressed already by compress_data
+        # chunk_dupes: {(checksum, compressed_size, decompressed_size): chunk} of written chunks
+        # faster than scanning previous_chunks, updated here
+        self.hash = chunk_hash
+        self.id = chunk_id
         # check duplicated data
-        if previous_chunks:
-            duped_id, duped_chunk = None, None
-            for id, chunk in enumerate(previous_chunks):
+        duped_chunk = None
+        dupe_key = (self.checksum, self.compressed_size, self.decompressed_size)
+        if chunk_dupes != None:
+            duped_chunk = chunk_dupes.get(dupe_key)
+        elif previous_chunks:
+            for chunk in previous_chunks:
                 if chunk.checksum == self.checksum and chunk.compressed_size == self.compressed_size and chunk.decompressed_size == self.decompressed_size:
-                    duped_id = id
                     duped_chunk = chunk
                     break
-            if duped_chunk != None:
-                # if there is a duped chunk in previous
-                if not duped_chunk.duplicated:
-                    # if the chunk was not a duped chunk
-                    # rewrite the duplicated value for the previous chunk
-                    duped_chunk.duplicated = True
-                    bs.seek(272 + duped_id * 32 + 21)
-                    bs.write_b(duped_chunk.duplicated)
-                # set this chunk as duplicated and copy the offset from duped chunk
-                self.duplicated = True
-                self.offset = duped_chunk.offset
+        if duped_chunk != None:
+            # if there is a duped chunk in previous
+            if not duped_chunk.duplicated:
+                # if the chunk was not a duped chunk
+                # rewrite the duplicated value for the previous chunk
+                duped_chunk.duplicated = True
+                bs.seek(272 + duped_chunk.id * 32 + 21)
+                bs.write_b(duped_chunk.duplicated)
+            # set this chunk as duplicated and copy the offset from duped chunk
+            self.duplicated = True
+            self.offset = duped_chunk.offset
+        elif chunk_dupes != None:
+            chunk_dupes[dupe_key] = self
         if not self.duplicated:
             # if its duplicated dont need to write data
             # go to end file, save data offset and write chunk data
@@ -220,7 +436,6 @@ class WADChunk:
             bs.write(self.data)
         # go to this chunk offset and write stuffs
         # hack: the first chunk start at 272 (because we write version 3.3)
-        self.id = chunk_id
         chunk_offset = 272 + chunk_id * 32
         bs.seek(chunk_offset)
         bs.write_u64(WADHasher.raw_or_hex_to_hash(chunk_hash))
@@ -229,90 +444,235 @@ class WADChunk:
             self.compressed_size,
             self.decompressed_size
         )
-        bs.write_u8(self.compression_type.value)
+        # type byte: compression type in the low 4 bits, subchunk count in the high 4 bits
+        bs.write_u8(self.compression_type.value | (self.subchunk_count or 0) << 4)
         bs.write_b(self.duplicated)
-        bs.write_u16(0)
+        bs.write_u16(self.subchunk_start or 0)
         bs.write_u64(self.checksum)
 
 
+class WADWriter:
+    # sequential writer of version 3.3
+    # space for the toc is reserved first, chunk data is streamed after it
+    # the toc is kept in memory and written once on close, sorted by path hash
+    def __init__(self, path, chunk_count, raw=False):
+        self.path = path
+        self.raw = raw
+        self.chunk_count = chunk_count
+        self.chunks = []
+        # {(checksum, compressed_size, decompressed_size): chunk} of chunks with data written
+        self.chunk_dupes = {}
+        self.bs = BytesStream.writer(path, raw)
+        self.offset = 272 + chunk_count * 32
+        self.bs.seek(self.offset)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type != None:
+            self.bs.close()
+            return
+        self.close()
+
+    def write_chunk(self, chunk):
+        # chunk must be compressed already by compress_data and have its hash set
+        if len(self.chunks) >= self.chunk_count:
+            raise Exception(
+                f'pyRitoFile: Error: Write WAD {self.path}: More chunks than reserved: {self.chunk_count}')
+        dupe_key = (chunk.checksum, chunk.compressed_size, chunk.decompressed_size)
+        duped_chunk = self.chunk_dupes.get(dupe_key)
+        if duped_chunk != None:
+            # same data already written, share its offset
+            duped_chunk.duplicated = True
+            chunk.duplicated = True
+            chunk.offset = duped_chunk.offset
+        else:
+            self.chunk_dupes[dupe_key] = chunk
+            chunk.offset = self.offset
+            if hasattr(chunk.data, 'read'):
+                # streamed compress: copy from its temp file
+                chunk.data.seek(0)
+                while True:
+                    data = chunk.data.read(WADChunk.BUFFER_SIZE)
+                    if len(data) == 0:
+                        break
+                    self.bs.write(data)
+            else:
+                self.bs.write(chunk.data)
+            self.offset += chunk.compressed_size
+        self.chunks.append(chunk)
+
+    def close(self):
+        # sort toc by path hash, the game binary searches it
+        wad = WAD()
+        wad.chunks = sorted(self.chunks, key=lambda chunk: WADHasher.raw_or_hex_to_hash(chunk.hash))
+        for chunk_id, chunk in enumerate(wad.chunks):
+            chunk.id = chunk_id
+        # unused reserved entries are left as zeros between toc and data
+        self.bs.seek(0)
+        wad.write_toc(self.bs)
+        data = self.bs.raw() if self.raw else None
+        self.bs.close()
+        return data
+
+
+class WADIndex:
+    # columnar toc: one array per field, position = chunk id
+    # 32 bytes per entry instead of a WADChunk object + hex string each
+    __slots__ = (
+        'hashes', 'offsets', 'compressed_sizes', 'decompressed_sizes',
+        'types', 'duplicated', 'subchunk_starts', 'checksums'
+    )
+    # hash, offset, compressed size, decompressed size, type, duplicated, subchunk start, checksum
+    TOC_ENTRY = Struct('<QIIIBBHQ')
+    # version 1 has no checksum
+    TOC_ENTRY_V1 = Struct('<QIIIBBH')
+
+    def __init__(self):
+        self.hashes = array('Q')
+        self.offsets = array('I')
+        self.compressed_sizes = array('I')
+        self.decompressed_sizes = array('I')
+        self.types = array('B')
+        self.duplicated = array('B')
+        self.subchunk_starts = array('H')
+        self.checksums = array('Q')
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def read(self, bs, chunk_count, major):
+        # whole toc in one read, decoded in C by iter_unpack
+        toc_entry = WADIndex.TOC_ENTRY_V1 if major == 1 else WADIndex.TOC_ENTRY
+        data = bs.read(chunk_count * toc_entry.size)
+        if len(data) != chunk_count * toc_entry.size:
+            raise Exception(
+                f'pyRitoFile: Error: Read WAD: TOC is cut off: {len(data)} bytes, expected {chunk_count * toc_entry.size}.')
+        if chunk_count == 0:
+            return self
+        columns = tuple(zip(*toc_entry.iter_unpack(data)))
+        self.hashes = array('Q', columns[0])
+        self.offsets = array('I', columns[1])
+        self.compressed_sizes = array('I', columns[2])
+        self.decompressed_sizes = array('I', columns[3])
+        self.types = array('B', columns[4])
+        self.duplicated = array('B', columns[5])
+        self.subchunk_starts = array('H', columns[6])
+        self.checksums = array('Q', columns[7]) if major != 1 else array('Q', bytes(chunk_count * 8))
+        return self
+
+    def chunk(self, chunk_id, hash=None):
+        # hash: path of the chunk if already known, hex of its hash by default
+        chunk_type = self.types[chunk_id]
+        return WADChunk(
+            id=chunk_id,
+            hash=WADHasher.hash_to_hex(self.hashes[chunk_id]) if hash == None else hash,
+            offset=self.offsets[chunk_id],
+            compressed_size=self.compressed_sizes[chunk_id],
+            decompressed_size=self.decompressed_sizes[chunk_id],
+            compression_type=WADCompressionType(chunk_type & 15),
+            duplicated=self.duplicated[chunk_id] != 0,
+            subchunk_start=self.subchunk_starts[chunk_id],
+            subchunk_count=chunk_type >> 4,
+            checksum=self.checksums[chunk_id]
+        )
+
+
 class WAD:
-    __slots__ = ('signature', 'version', 'chunks')
+    __slots__ = ('signature', 'version', 'index', 'chunk_list')
 
     def __init__(self, signature=None, version=None, chunks=None):
         self.signature = signature
         self.version = version
-        self.chunks = chunks
+        self.index = None
+        self.chunk_list = chunks
 
     def __json__(self):
-        return {key: getattr(self, key) for key in self.__slots__ if key != 'IO'}
+        return {'signature': self.signature, 'version': self.version, 'chunks': self.chunks}
 
-    def read(self, path, raw=False):
-        with BytesStream.reader(path, raw) as bs:
-            # read header
-            self.signature, = bs.read_s(2)
-            if self.signature != 'RW':
-                raise Exception(
-                    f'pyRitoFile: Error: Read WAD {path}: Wrong file signature: {self.signature}')
-            major, minor = bs.read_u8(2)
-            self.version = float(f'{major}.{minor}')
-            if major > 3:
-                raise Exception(
-                    f'pyRitoFile: Error: Read WAD {path}: Unsupported file version: {self.version}')
-            wad_checksum = 0
-            if major == 2:
-                ecdsa_len = bs.read_u8()
-                bs.pad(83)
-                wad_checksum, = bs.read_u64()
-            elif major == 3:
-                bs.pad(256)
-                wad_checksum, = bs.read_u64()
-            if major == 1 or major == 2:
-                toc_start_offset, toc_file_entry_size = bs.read_u16(
-                    2)
-            # read chunks
-            chunk_count, = bs.read_u32()
-            self.chunks = [WADChunk() for i in range(chunk_count)]
-            for chunk_id, chunk in enumerate(self.chunks):
-                chunk.id = chunk_id
-                chunk.hash = WADHasher.hash_to_hex(bs.read_u64()[0])
-                chunk.offset, chunk.compressed_size, chunk.decompressed_size, = bs.read_u32(
-                    3)
-                chunk.compression_type = WADCompressionType(
-                    bs.read_u8()[0] & 15)
-                chunk.duplicated, = bs.read_b()
-                chunk.subchunk_start, = bs.read_u16()
-                chunk.subchunk_count = chunk.compression_type.value >> 4
-                chunk.checksum = bs.read_u64()[0] if major >= 2 else 0
-            
-            return self
+    @property
+    def chunks(self):
+        # read() only fills the index, chunk objects are made on first access
+        if self.chunk_list == None and self.index != None:
+            self.chunk_list = [self.index.chunk(chunk_id) for chunk_id in range(len(self.index))]
+        return self.chunk_list
+
+    @chunks.setter
+    def chunks(self, chunks):
+        self.chunk_list = chunks
+
+    def read(self, path, raw=False, mmap=None):
+        with BytesStream.reader(path, raw, mmap) as bs:
+            return self.read_toc(bs, path)
+
+    def read_toc(self, bs, path=''):
+        # header and toc from the start of bs, chunk data is not touched
+        # read header
+        self.signature, = bs.read_s(2)
+        if self.signature != 'RW':
+            raise Exception(
+                f'pyRitoFile: Error: Read WAD {path}: Wrong file signature: {self.signature}')
+        major, minor = bs.read_u8(2)
+        self.version = float(f'{major}.{minor}')
+        if major > 3:
+            raise Exception(
+                f'pyRitoFile: Error: Read WAD {path}: Unsupported file version: {self.version}')
+        wad_checksum = 0
+        if major == 2:
+            ecdsa_len = bs.read_u8()
+            bs.pad(83)
+            wad_checksum, = bs.read_u64()
+        elif major == 3:
+            bs.pad(256)
+            wad_checksum, = bs.read_u64()
+        if major == 1 or major == 2:
+            toc_start_offset, toc_file_entry_size = bs.read_u16(
+                2)
+        # read chunks
+        chunk_count, = bs.read_u32()
+        self.index = WADIndex().read(bs, chunk_count, major)
+        self.chunk_list = None
+        return self
 
     def write(self, path, raw=False):
         with BytesStream.writer(path, raw) as bs:
-            # write header
-            bs.write_s('RW')  # signature
-            bs.write_u8(3, 3)  # version
-            bs.write(b'\x00' * 256)  # pad 256 bytes
-            bs.write_u64(0)  # wad checksum
-            bs.write_u32(len(self.chunks))
-            # write chunks
-            for chunk in self.chunks:
-                bs.write_u64(WADHasher.raw_or_hex_to_hash(chunk.hash))
-                bs.write_u32(
-                    chunk.offset,
-                    chunk.compressed_size,
-                    chunk.decompressed_size
-                )
-                bs.write_u8(chunk.compression_type.value)
-                bs.write_b(chunk.duplicated)
-                bs.write_u16(chunk.subchunk_start)
-                bs.write_u64(chunk.checksum)
+            self.write_toc(bs)
             return bs.raw() if raw else None
 
+    def write_toc(self, bs):
+        # header and toc of version 3.3 at the current position (should be 0)
+        # write header
+        bs.write_s('RW')  # signature
+        bs.write_u8(3, 3)  # version
+        bs.write(b'\x00' * 256)  # pad 256 bytes
+        bs.write_u64(0)  # wad checksum
+        bs.write_u32(len(self.chunks))
+        # write chunks
+        for chunk in self.chunks:
+            bs.write_u64(WADHasher.raw_or_hex_to_hash(chunk.hash))
+            bs.write_u32(
+                chunk.offset,
+                chunk.compressed_size,
+                chunk.decompressed_size
+            )
+            # type byte: compression type in the low 4 bits, subchunk count in the high 4 bits
+            bs.write_u8(chunk.compression_type.value | (chunk.subchunk_count or 0) << 4)
+            bs.write_b(chunk.duplicated)
+            bs.write_u16(chunk.subchunk_start or 0)
+            bs.write_u64(chunk.checksum)
+
     def un_hash(self, hashtables=None):
         if hashtables == None:
             return
+        if self.chunk_list == None and self.index != None:
+            # chunks not made yet: look up the toc ints, no hex string for known hashes
+            raws = WADHasher.hashes_to_raws(hashtables, self.index.hashes)
+            self.chunk_list = [self.index.chunk(chunk_id, raw) for chunk_id, raw in enumerate(raws)]
+        else:
+            for chunk in self.chunks:
+                chunk.hash = WADHasher.hex_to_raw(hashtables, chunk.hash)
         for chunk in self.chunks:
-            chunk.hash = WADHasher.hex_to_raw(hashtables, chunk.hash)
             if '.' in chunk.hash and chunk.extension == None:
                 chunk.extension = WADExtensioner.get_extension(chunk.hash)
         self.chunks = sorted(self.chunks, key=lambda chunk: chunk.hash)
@@ -323,3 +683,116 @@ class WAD:
             if compare_func(item):
                 res.append(item)
         return res
+
+
+class WADArchive:
+    # random access to the files of one wad, the file is opened (memory mapped) once
+    # lookups by path or hash binary search the toc sorted by hash
+    # chunks are decompressed on demand and kept in a LRU cache bounded by bytes
+    CACHE_SIZE = 1024**2*64
+
+    def __init__(self, path, cache_size=None, mmap=True):
+        self.path = path
+        self.bs = BytesStream.reader(path, mmap=mmap)
+        try:
+            self.wad = WAD().read_toc(self.bs, path)
+        except:
+            self.bs.close()
+            raise
+        index = self.wad.index
+        # toc written by the game is sorted already, old packers wrote it in walk order
+        if all(index.hashes[i] <= index.hashes[i+1] for i in range(len(index)-1)):
+            self.sorted_hashes = index.hashes
+            self.sorted_ids = None
+        else:
+            self.sorted_ids = array('I', sorted(range(len(index)), key=index.hashes.__getitem__))
+            self.sorted_hashes = array('Q', (index.hashes[i] for i in self.sorted_ids))
+        self.cache_size = WADArchive.CACHE_SIZE if cache_size == None else cache_size
+        self.cache_used = 0
+        # {chunk offset: decompressed data}, offset so duplicated chunks share one entry
+        self.cache = OrderedDict()
+        # stream and cache are shared by threads of the backend
+        self.lock = Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return len(self.wad.index)
+
+    def __contains__(self, path_or_hash):
+        return self.find(path_or_hash) != None
+
+    def close(self):
+        with self.lock:
+            self.cache.clear()
+            self.cache_used = 0
+            if self.bs != None:
+                self.bs.close()
+                self.bs = None
+
+    def find(self, path_or_hash):
+        # chunk id of a path, hex string or int hash, None if not in this wad
+        hash = path_or_hash if isinstance(path_or_hash, int) else WADHasher.raw_or_hex_to_hash(path_or_hash)
+        i = bisect_left(self.sorted_hashes, hash)
+        if i == len(self.sorted_hashes) or self.sorted_hashes[i] != hash:
+            return None
+        return i if self.sorted_ids == None else self.sorted_ids[i]
+
+    def chunk(self, path_or_hash):
+        chunk_id = self.find(path_or_hash)
+        if chunk_id == None:
+            raise Exception(
+                f'pyRitoFile: Error: Read WAD {self.path}: Chunk not found: {path_or_hash}')
+        return self.wad.index.chunk(chunk_id)
+
+    def read(self, path_or_hash):
+        # decompressed bytes of one file
+        chunk = self.chunk(path_or_hash)
+        if chunk.compression_type == WADCompressionType.Satellite:
+            raise Exception(
+                f'pyRitoFile: Error: Read WAD {self.path}: {chunk.hash}: Satellite chunk is not supported.')
+        with self.lock:
+            data = self.cache.get(chunk.offset)
+            if data != None:
+                self.cache.move_to_end(chunk.offset)
+                return data
+            if self.bs == None:
+                raise Exception(
+                    f'pyRitoFile: Error: Read WAD {self.path}: Archive is closed.')
+            self.bs.seek(chunk.offset)
+            raw = self.bs.read_view(chunk.compressed_size)
+        # decompress outside the lock so threads can work on different chunks
+        try:
+            chunk.decompress_data(raw)
+        finally:
+            raw.release()
+        data = chunk.data
+        chunk.free_data()
+        # chunks bigger than the whole cache are not kept
+        if len(data) <= self.cache_size:
+            with self.lock:
+                if chunk.offset not in self.cache:
+                    self.cache[chunk.offset] = data
+                    self.cache_used += len(data)
+                    while self.cache_used > self.cache_size:
+                        _, old_data = self.cache.popitem(last=False)
+                        self.cache_used -= len(old_data)
+        return data
+
+    def read_raw(self, path_or_hash):
+        # compressed bytes of one file as stored in the wad, not cached
+        chunk = self.chunk(path_or_hash)
+        with self.lock:
+            if self.bs == None:
+                raise Exception(
+                    f'pyRitoFile: Error: Read WAD {self.path}: Archive is closed.')
+            self.bs.seek(chunk.offset)
+            return self.bs.read(chunk.compressed_size)
+
+    def open(self, path_or_hash):
+        # read stream over one file, for the pyRitoFile readers use read() with raw=True
+        return BufferReader(self.read(path_or_hash))
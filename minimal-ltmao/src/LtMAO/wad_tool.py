@@ -1,107 +1,309 @@
 from . import lepath, pyRitoFile
-import os, json
+# not safe because external modules
+try:
+    from xxhash import xxh3_64
+except:
+    print('Warning: wad_tool failed to import xxhash.')
+import os, json, time, re, tempfile
+from fnmatch import translate
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import multiprocessing
 
 
 
-def unpack(wad_file, raw_dir, hashtables, filter=None):
+class ChunkFilter:
+    # select chunks by their resolved path before any chunk data is read
+    # names: exact paths (old filter), include/exclude: glob patterns (case insensitive)
+    # extensions: 'bin', '.skn'... regex: pattern searched in the path
+    # max_size: max decompressed size in bytes
+    def __init__(self, names=None, include=None, exclude=None, extensions=None, regex=None, max_size=None):
+        self.names = set(names) if names != None else None
+        self.include = ChunkFilter.compile_globs(include)
+        self.exclude = ChunkFilter.compile_globs(exclude)
+        self.extensions = tuple(
+            '.' + extension.lower().lstrip('.') for extension in extensions) if extensions != None else None
+        self.regex = re.compile(regex) if isinstance(regex, str) else regex
+        self.max_size = max_size
+
+    @staticmethod
+    def compile_globs(patterns):
+        # all globs in one regex, matched once per chunk
+        if patterns == None:
+            return None
+        if isinstance(patterns, str):
+            patterns = [patterns]
+        return re.compile('|'.join(translate(pattern.lower()) for pattern in patterns))
+
+    def match(self, chunk, bs=None):
+        if self.names != None and chunk.hash not in self.names:
+            return False
+        if self.max_size != None and chunk.decompressed_size > self.max_size:
+            return False
+        path = chunk.hash.lower()
+        if self.include != None and self.include.match(path) == None:
+            return False
+        if self.exclude != None and self.exclude.match(path) != None:
+            return False
+        if self.regex != None and self.regex.search(chunk.hash) == None:
+            return False
+        if self.extensions != None and not path.endswith(self.extensions):
+            # unresolved hash has no extension in its name
+            # sniff it from the first bytes of the chunk, if a stream is given
+            if bs == None or not pyRitoFile.wad.WADHasher.is_hash(chunk.hash):
+                return False
+            extension = chunk.sniff_extension(bs)
+            if extension == None or f'.{extension}' not in self.extensions:
+                return False
+        return True
+
+
+def make_dirs(dir_path, created_dirs, is_bin=False):
+    # makedirs once per dir, created_dirs is the cache of dirs done already
+    if dir_path in created_dirs:
+        return
+    # OneDrive-aware directory creation (optimized)
+    try:
+        os.makedirs(dir_path, exist_ok=True)
+        # Only apply OneDrive delay for critical .bin files
+        if 'OneDrive' in dir_path and is_bin:
+            time.sleep(0.01)  # Minimal delay only for .bin files
+            print(f"wad_tool: OneDrive sync delay applied for: {os.path.basename(dir_path)}")
+    except (OSError, PermissionError) as e:
+        print(f"wad_tool: Warning: Failed to create directory {dir_path}: {e}")
+        print(f"wad_tool: Directory path length: {len(dir_path)} chars")
+        print(f"wad_tool: OneDrive path: {'Yes' if 'OneDrive' in dir_path else 'No'}")
+        # Continue anyway - the file creation will handle it
+    created_dirs.add(dir_path)
+
+
+def write_chunk_file(fo, chunk, raw, buffer_size):
+    # raw: set for a streamed chunk, decompressed straight into the file
+    if raw != None:
+        chunk.decompress_to_file(raw, fo, buffer_size)
+    else:
+        fo.write(chunk.data)
+
+
+def unpack_chunk(chunk, raw, raw_dir, chunk_dirs, buffer_size=None):
+    # decompress one chunk from its raw bytes and write it out
+    # chunks bigger than buffer_size (default WADChunk.BUFFER_SIZE) are streamed
+    # to the file in pieces of buffer_size, not decompressed whole
+    # return the written file path (None if failed)
+    # and the hashed files created for this chunk: {hashed basename: chunk hash}
+    if buffer_size == None:
+        buffer_size = pyRitoFile.wad.WADChunk.BUFFER_SIZE
+    try:
+        if chunk.decompressed_size > buffer_size:
+            # extension is needed for the file path before any data is written
+            if chunk.extension == None:
+                chunk.extension = pyRitoFile.wad.WADExtensioner.sniff_extension(chunk.compression_type, raw)
+            return write_unpacked_chunk(chunk, raw, raw_dir, chunk_dirs, buffer_size)
+        chunk.decompress_data(raw)
+        return write_unpacked_chunk(chunk, None, raw_dir, chunk_dirs, buffer_size)
+    finally:
+        raw.release()
+
+
+def write_unpacked_chunk(chunk, raw, raw_dir, chunk_dirs, buffer_size):
+    hashed_files = {}
+    # output file path of this chunk
+    file_path = lepath.join(raw_dir, chunk.hash)
+    # add extension to hashed file if know
+    if pyRitoFile.wad.WADHasher.is_hash(chunk.hash) and chunk.extension != None:
+        ext = f'.{chunk.extension}'
+        if not file_path.endswith(ext):
+            file_path += ext
+
+    should_be_hashed = False
+    # hash file with long basename
+    if len(os.path.basename(file_path)) > 255:
+        should_be_hashed = True
+    # hash file same name with dir of another chunk or a dir already on disk
+    if os.path.normcase(file_path) in chunk_dirs or os.path.isdir(file_path):
+        should_be_hashed = True
+    if should_be_hashed:
+        basename = pyRitoFile.wad.WADHasher.raw_to_hex(chunk.hash)
+        if chunk.extension != None:
+            basename += f'.{chunk.extension}'
+        hashed_file =  lepath.join(raw_dir, basename)
+        hashed_files[basename] = chunk.hash
+        file_path = hashed_file
+    # write out chunk data to file
+    try:
+        # dir is created by unpack before the chunk is read
+        # Wait for OneDrive sync if path contains OneDrive (optimized)
+        if 'OneDrive' in file_path and file_path.endswith('.bin'):
+            time.sleep(0.01)  # Minimal delay only for critical .bin files
+            print(f"wad_tool: OneDrive sync delay applied for: {os.path.basename(file_path)}")
+        # Skip delay for all other files to maintain speed
+
+        with open(file_path, 'wb') as fo:
+            write_chunk_file(fo, chunk, raw, buffer_size)
+
+    except (FileNotFoundError, OSError) as e:
+        # Handle path length issues and OneDrive sync problems
+        print(f"wad_tool: Warning: Failed to write {file_path}: {e}")
+        print(f"wad_tool: Path length: {len(file_path)} chars, OneDrive: {'Yes' if 'OneDrive' in file_path else 'No'}")
+
+        # Try with shorter path by using hash
+        if len(file_path) > 200:  # Windows path limit safety
+            print(f"wad_tool: Attempting fallback with shorter path...")
+            basename = pyRitoFile.wad.WADHasher.raw_to_hex(chunk.hash)
+            if chunk.extension != None:
+                basename += f'.{chunk.extension}'
+            short_file_path = lepath.join(raw_dir, basename)
+
+            print(f"wad_tool: Fallback path: {short_file_path} (length: {len(short_file_path)} chars)")
+
+            try:
+                os.makedirs(os.path.dirname(short_file_path), exist_ok=True)
+                with open(short_file_path, 'wb') as fo:
+                    write_chunk_file(fo, chunk, raw, buffer_size)
+                print(f'wad_tool: Fallback: Unpack: {basename} (original: {chunk.hash})')
+                file_path = short_file_path
+            except Exception as e2:
+                print(f"wad_tool: Error: Failed to write even with short path {short_file_path}: {e2}")
+                print(f"wad_tool: This may indicate OneDrive sync issues or permission problems")
+                return None, hashed_files
+        else:
+            print(f"wad_tool: Error: Failed to write {file_path}: {e}")
+            print(f"wad_tool: This may be due to OneDrive sync delays or permission issues")
+            return None, hashed_files
+    chunk.free_data()
+    print(f'wad_tool: Finish: Unpack: {chunk.hash}')
+    return file_path, hashed_files
+
+
+def read_manifest(raw_dir):
+    # manifest of a previous unpack into raw_dir
+    # {chunk path: [file, checksum, compressed size, decompressed size, mtime ns, hashed]}
+    manifest_file = lepath.join(raw_dir, 'unpack_manifest.json')
+    if not os.path.exists(manifest_file):
+        return {}
+    try:
+        with open(manifest_file, 'r', encoding='utf-8') as f:
+            return json.load(f)['chunks']
+    except Exception as e:
+        print(f'wad_tool: Warning: Ignored bad manifest {manifest_file}: {e}')
+        return {}
+
+
+def write_manifest(raw_dir, manifest):
+    with open(lepath.join(raw_dir, 'unpack_manifest.json'), 'w+', encoding='utf-8') as f:
+        json.dump({'version': 1, 'chunks': manifest}, f, ensure_ascii=False)
+
+
+def manifest_entry(chunk, file_path, raw_dir, hashed):
+    return [
+        lepath.rel(file_path, raw_dir),
+        chunk.checksum,
+        chunk.compressed_size,
+        chunk.decompressed_size,
+        os.stat(file_path).st_mtime_ns,
+        hashed
+    ]
+
+
+def is_unchanged(entry, chunk, raw_dir):
+    # same data in toc as last unpack and the file was not touched since
+    # wads without checksums (version 1) are always extracted
+    if chunk.checksum == 0 or entry[1:4] != [chunk.checksum, chunk.compressed_size, chunk.decompressed_size]:
+        return False
+    try:
+        stat = os.stat(lepath.join(raw_dir, entry[0]))
+    except OSError:
+        return False
+    return stat.st_size == chunk.decompressed_size and stat.st_mtime_ns == entry[4]
+
+
+def unpack(wad_file, raw_dir, hashtables, filter=None, workers=1, include=None, exclude=None, extensions=None, regex=None, max_size=None, manifest=False, buffer_size=None):
     print(f'wad_tool: Start:  Unpack WAD: {wad_file}')
     # read wad
-    wad = pyRitoFile.wad.WAD().read(wad_file)
+    wad = pyRitoFile.wad.WAD().read(wad_file, mmap=True)
     wad.un_hash(hashtables)
     hashed_files = {}
-    # create dirs first with OneDrive handling
-    with pyRitoFile.stream.BytesStream.reader(wad_file) as bs:
-        for chunk in wad.chunks:
-            file_path = lepath.join(raw_dir, chunk.hash)
-            dir_path = os.path.dirname(file_path)
-            
-            # OneDrive-aware directory creation (optimized)
-            try:
-                os.makedirs(dir_path, exist_ok=True)
-                # Only apply OneDrive delay for critical .bin files
-                if 'OneDrive' in dir_path and chunk.hash.endswith('.bin'):
-                    import time
-                    time.sleep(0.01)  # Minimal delay only for .bin files
-                    print(f"wad_tool: OneDrive sync delay applied for: {os.path.basename(dir_path)}")
-            except (OSError, PermissionError) as e:
-                print(f"wad_tool: Warning: Failed to create directory {dir_path}: {e}")
-                print(f"wad_tool: Directory path length: {len(dir_path)} chars")
-                print(f"wad_tool: OneDrive path: {'Yes' if 'OneDrive' in dir_path else 'No'}")
-                # Continue anyway - the file creation will handle it
+    # every dir of every chunk path, in memory instead of creating them all first
+    # a file with the same path as one of them is hashed
+    chunk_dirs = set()
+    for chunk in wad.chunks:
+        dir_path = os.path.normcase(os.path.dirname(lepath.join(raw_dir, chunk.hash)))
+        while len(dir_path) > len(raw_dir) and dir_path not in chunk_dirs:
+            chunk_dirs.add(dir_path)
+            dir_path = os.path.dirname(dir_path)
     # actual extract
-    with pyRitoFile.stream.BytesStream.reader(wad_file) as bs:
-        for chunk in wad.chunks:
-            if filter != None and chunk.hash not in filter:
-                continue
-            # read chunk data first to get extension
-            chunk.read_data(bs)
-            # output file path of this chunk
-            file_path = lepath.join(raw_dir, chunk.hash)
-            # add extension to hashed file if know
-            if pyRitoFile.wad.WADHasher.is_hash(chunk.hash) and chunk.extension != None:
-                ext = f'.{chunk.extension}'
-                if not file_path.endswith(ext):
-                    file_path += ext
-
-            should_be_hashed = False
-            # hash file with long basename
-            if len(os.path.basename(file_path)) > 255:
-                should_be_hashed = True
-            # hash file same name with dir
-            if os.path.exists(file_path) and os.path.isdir(file_path):
-                should_be_hashed = True
-            if should_be_hashed:
-                basename = pyRitoFile.wad.WADHasher.raw_to_hex(chunk.hash)
-                if chunk.extension != None:
-                    basename += f'.{chunk.extension}'
-                hashed_file =  lepath.join(raw_dir, basename)
-                hashed_files[basename] = chunk.hash
-                file_path = hashed_file
-            # write out chunk data to file
-            try:
-                # Ensure directory exists (OneDrive sync issue fix)
-                os.makedirs(os.path.dirname(file_path), exist_ok=True)
-                
-                # Wait for OneDrive sync if path contains OneDrive (optimized)
-                if 'OneDrive' in file_path and file_path.endswith('.bin'):
-                    import time
-                    time.sleep(0.01)  # Minimal delay only for critical .bin files
-                    print(f"wad_tool: OneDrive sync delay applied for: {os.path.basename(file_path)}")
-                # Skip delay for all other files to maintain speed
-                
-                with open(file_path, 'wb') as fo:
-                    fo.write(chunk.data)
-                    
-            except (FileNotFoundError, OSError) as e:
-                # Handle path length issues and OneDrive sync problems
-                print(f"wad_tool: Warning: Failed to write {file_path}: {e}")
-                print(f"wad_tool: Path length: {len(file_path)} chars, OneDrive: {'Yes' if 'OneDrive' in file_path else 'No'}")
-                
-                # Try with shorter path by using hash
-                if len(file_path) > 200:  # Windows path limit safety
-                    print(f"wad_tool: Attempting fallback with shorter path...")
-                    basename = pyRitoFile.wad.WADHasher.raw_to_hex(chunk.hash)
-                    if chunk.extension != None:
-                        basename += f'.{chunk.extension}'
-                    short_file_path = lepath.join(raw_dir, basename)
-                    
-                    print(f"wad_tool: Fallback path: {short_file_path} (length: {len(short_file_path)} chars)")
-                    
-                    try:
-                        os.makedirs(os.path.dirname(short_file_path), exist_ok=True)
-                        with open(short_file_path, 'wb') as fo:
-                            fo.write(chunk.data)
-                        print(f'wad_tool: Fallback: Unpack: {basename} (original: {chunk.hash})')
-                    except Exception as e2:
-                        print(f"wad_tool: Error: Failed to write even with short path {short_file_path}: {e2}")
-                        print(f"wad_tool: This may indicate OneDrive sync issues or permission problems")
-                        continue
-                else:
-                    print(f"wad_tool: Error: Failed to write {file_path}: {e}")
-                    print(f"wad_tool: This may be due to OneDrive sync delays or permission issues")
+    # chunks are read in offset order so the wad is read front to back
+    # the main thread reads chunk bytes (memory mapped, no copies) and creates dirs
+    # workers decompress and write them, with a bounded number of chunks in flight
+    chunk_order = sorted(range(len(wad.chunks)), key=lambda id: wad.chunks[id].offset)
+    # filter is a ChunkFilter or a list of exact paths
+    if not isinstance(filter, ChunkFilter):
+        filter = ChunkFilter(filter, include, exclude, extensions, regex, max_size)
+    # hashed files of each chunk, by chunk position, merged in path order at the end
+    chunk_hashed_files = [None] * len(wad.chunks)
+    # manifest: incremental unpack, files of a previous unpack with the same toc data are skipped
+    # opt in, it leaves unpack_manifest.json in raw_dir (pack skips it)
+    old_manifest = read_manifest(raw_dir) if manifest else {}
+    new_manifest = dict(old_manifest)
+    skipped_count = 0
+    created_dirs = set()
+    make_dirs(raw_dir, created_dirs)
+    start_time = time.perf_counter()
+    chunk_count, chunk_bytes = 0, 0
+    executor = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+    pending = deque()
+    try:
+        with pyRitoFile.stream.BytesStream.reader(wad_file, mmap=True) as bs:
+            for id in chunk_order:
+                chunk = wad.chunks[id]
+                if not filter.match(chunk, bs):
+                    continue
+                entry = old_manifest.get(chunk.hash)
+                if entry != None and is_unchanged(entry, chunk, raw_dir):
+                    if entry[5]:
+                        chunk_hashed_files[id] = {entry[0]: chunk.hash}
+                    skipped_count += 1
                     continue
-            chunk.free_data()
-            print(f'wad_tool: Finish: Unpack: {chunk.hash}')
+                new_manifest.pop(chunk.hash, None)
+                chunk_count += 1
+                chunk_bytes += chunk.decompressed_size
+                make_dirs(os.path.dirname(lepath.join(raw_dir, chunk.hash)), created_dirs, chunk.hash.endswith('.bin'))
+                bs.seek(chunk.offset)
+                raw = bs.read_view(chunk.compressed_size)
+                if executor == None:
+                    file_path, chunk_hashed_files[id] = unpack_chunk(chunk, raw, raw_dir, chunk_dirs, buffer_size)
+                    if file_path != None:
+                        new_manifest[chunk.hash] = manifest_entry(chunk, file_path, raw_dir, len(chunk_hashed_files[id]) > 0)
+                    continue
+                pending.append((id, executor.submit(unpack_chunk, chunk, raw, raw_dir, chunk_dirs, buffer_size)))
+                if len(pending) >= workers * 2:
+                    pending_id, future = pending.popleft()
+                    file_path, chunk_hashed_files[pending_id] = future.result()
+                    if file_path != None:
+                        new_manifest[wad.chunks[pending_id].hash] = manifest_entry(wad.chunks[pending_id], file_path, raw_dir, len(chunk_hashed_files[pending_id]) > 0)
+            while len(pending) > 0:
+                pending_id, future = pending.popleft()
+                file_path, chunk_hashed_files[pending_id] = future.result()
+                if file_path != None:
+                    new_manifest[wad.chunks[pending_id].hash] = manifest_entry(wad.chunks[pending_id], file_path, raw_dir, len(chunk_hashed_files[pending_id]) > 0)
+    finally:
+        if executor != None:
+            executor.shutdown(cancel_futures=True)
+    # path order, same as hashed_files.json of a path ordered extract
+    for files in chunk_hashed_files:
+        if files != None:
+            hashed_files.update(files)
+    seconds = max(time.perf_counter() - start_time, 1e-9)
+    stats = {
+        'chunks': chunk_count,
+        'bytes': chunk_bytes,
+        'seconds': seconds,
+        'chunks_per_second': chunk_count / seconds,
+        'mb_per_second': chunk_bytes / 1024**2 / seconds,
+        'workers': workers,
+        'skipped': skipped_count
+    }
+    print(f'wad_tool: Finish: Unpack WAD: {wad_file}: {chunk_count} chunks, {chunk_bytes/1024**2:.2f} MB in {seconds:.2f}s ({stats["chunks_per_second"]:.0f} chunks/s, {stats["mb_per_second"]:.2f} MB/s, {workers} workers), {skipped_count} unchanged skipped')
     # remove empty dirs
     for root, dirs, files in os.walk(raw_dir, topdown=False):
         if len(os.listdir(root)) == 0:
@@ -110,17 +312,119 @@ def unpack(wad_file, raw_dir, hashtables, filter=None):
     if len(hashed_files) > 0:
         with open(lepath.join(raw_dir, 'hashed_files.json'), 'w+', encoding='utf-8') as f:
             json.dump(hashed_files, f, indent=4, ensure_ascii=False)
+    # write manifest for the next unpack
+    if manifest and len(new_manifest) > 0 and os.path.isdir(raw_dir):
+        write_manifest(raw_dir, new_manifest)
+    return stats
+
+
+def pack_chunk(chunk, file_path, level=None, old_wad=None, old_entry=None, buffer_size=None):
+    # read and compress one file into its chunk
+    # files bigger than buffer_size (default WADChunk.BUFFER_SIZE) are not read whole, see pack_chunk_stream
+    # old_wad: WADArchive of the previous pack, unchanged files reuse its compressed bytes
+    # old_entry: pack manifest entry of this file from the previous pack
+    # return the chunk and the new pack manifest entry
+    if buffer_size == None:
+        buffer_size = pyRitoFile.wad.WADChunk.BUFFER_SIZE
+    stat = os.stat(file_path)
+    old_chunk = None
+    if old_wad != None:
+        old_id = old_wad.find(chunk.hash)
+        if old_id != None:
+            old_chunk = old_wad.wad.index.chunk(old_id)
+            # same data size is required to be the same file
+            # subchunks point into the old wad subchunk toc, which is not carried over
+            if old_chunk.decompressed_size != stat.st_size or old_chunk.subchunk_count > 0:
+                old_chunk = None
+            # manifest entry must describe the same old chunk
+            if old_entry != None and (old_chunk == None or old_entry[3] != old_chunk.checksum):
+                old_entry = None
+    # untouched since the last pack: reuse without reading the file
+    if old_chunk != None and old_entry != None and old_entry[0] == stat.st_mtime_ns and old_entry[1] == stat.st_size:
+        reuse_chunk(chunk, old_chunk, old_wad.read_raw(old_chunk.hash))
+        return chunk, [stat.st_mtime_ns, stat.st_size, old_entry[2], chunk.checksum]
+    if stat.st_size > buffer_size:
+        return pack_chunk_stream(chunk, file_path, stat, level, old_wad, old_chunk, old_entry, buffer_size)
+    with open(file_path, 'rb') as f:
+        chunk_data = f.read()
+    content_hash = xxh3_64(chunk_data).intdigest()
+    if old_chunk != None:
+        # touched but same content, or no manifest yet: compare with the old data
+        if (old_entry != None and old_entry[2] == content_hash) or (old_entry == None and old_wad.read(old_chunk.hash) == chunk_data):
+            reuse_chunk(chunk, old_chunk, old_wad.read_raw(old_chunk.hash))
+            return chunk, [stat.st_mtime_ns, stat.st_size, content_hash, chunk.checksum]
+    chunk.compress_data(chunk_data, level)
+    return chunk, [stat.st_mtime_ns, stat.st_size, content_hash, chunk.checksum]
+
 
+def pack_chunk_stream(chunk, file_path, stat, level, old_wad, old_chunk, old_entry, buffer_size):
+    # compress a big file from its memory map into a temp file, same bytes as compress_data
+    # the temp file stays in memory up to buffer_size, then spills to disk
+    with open(file_path, 'rb') as f:
+        if old_chunk != None and old_entry != None:
+            # touched but maybe same content: hash the file first
+            content_hash = xxh3_64()
+            while True:
+                data = f.read(buffer_size)
+                if len(data) == 0:
+                    break
+                content_hash.update(data)
+            content_hash = content_hash.intdigest()
+            if old_entry[2] == content_hash:
+                reuse_chunk(chunk, old_chunk, old_wad.read_raw(old_chunk.hash))
+                return chunk, [stat.st_mtime_ns, stat.st_size, content_hash, chunk.checksum]
+        # no manifest entry: old data is not decompressed whole to compare, just recompress
+        content_hash = chunk.compress_file(f, tempfile.SpooledTemporaryFile(max_size=buffer_size), level, buffer_size)
+    return chunk, [stat.st_mtime_ns, stat.st_size, content_hash, chunk.checksum]
 
-def pack(raw_dir, wad_file):
+
+def reuse_chunk(chunk, old_chunk, raw):
+    # copy compressed bytes and toc values verbatim from the old wad
+    chunk.data = raw
+    chunk.compression_type = old_chunk.compression_type
+    chunk.compressed_size = old_chunk.compressed_size
+    chunk.decompressed_size = old_chunk.decompressed_size
+    chunk.subchunk_start = old_chunk.subchunk_start
+    chunk.subchunk_count = old_chunk.subchunk_count
+    chunk.checksum = old_chunk.checksum
+
+
+def write_packed_chunk(writer, chunk, entry, pack_manifest):
+    writer.write_chunk(chunk)
+    chunk.free_data()
+    pack_manifest[chunk.hash] = entry
+    print(f'wad_tool: Finish: Pack: {chunk.hash}')
+
+
+def read_pack_manifest(raw_dir, level):
+    # manifest of the previous incremental pack of raw_dir
+    # {chunk path: [mtime ns, size, content xxh3, chunk checksum]}
+    # None = dont reuse old chunks at all
+    manifest_file = lepath.join(raw_dir, 'pack_manifest.json')
+    if not os.path.exists(manifest_file):
+        # no manifest: old wad is assumed to be packed with the default level
+        return {} if level == None else None
+    try:
+        with open(manifest_file, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        # old chunks were compressed with another level, dont reuse them
+        if manifest['level'] != level:
+            return None
+        return manifest['chunks']
+    except Exception as e:
+        print(f'wad_tool: Warning: Ignored bad manifest {manifest_file}: {e}')
+        return {} if level == None else None
+
+
+def pack(raw_dir, wad_file, level=None, workers=1, incremental=False, old_wad_file=None, buffer_size=None):
     print(f'wad_tool: Start:  Pack WAD: {raw_dir}')
     # create wad first with only infos
     chunk_datas = []
     chunk_hashes = []
     for root, dirs, files in os.walk(raw_dir):
         for file in files:
-            # skip hashed bins json
-            if file == 'hashed_files.json':
+            # skip hashed bins json and manifests
+            if file in ('hashed_files.json', 'unpack_manifest.json', 'pack_manifest.json'):
                 continue
             # prepare chunk datas
             file_path = lepath.join(root, file)
@@ -137,16 +441,410 @@ def pack(raw_dir, wad_file):
             else:
                 chunk_hashes.append(lepath.rel(file_path, raw_dir))
     # write wad
-    wad = pyRitoFile.wad.WAD()
-    wad.chunks = [pyRitoFile.wad.WADChunk.default()
-                  for id in range(len(chunk_hashes))]
-    wad.write(wad_file)
-    # write wad chunk
-    with pyRitoFile.stream.BytesStream.updater(wad_file) as bs:
-        for id, chunk in enumerate(wad.chunks):
-            with open(chunk_datas[id], 'rb') as f:
-                chunk_data = f.read()
-            chunk.write_data(bs, id, chunk_hashes[id], chunk_data, previous_chunks=wad.chunks[:id])
-            chunk.free_data()
-            print(f'wad_tool: Finish: Pack: {chunk.hash}')
+    # chunks go in path hash order, same as the toc, so the file is written front to back
+    chunk_ids = sorted(range(len(chunk_hashes)), key=lambda id: pyRitoFile.wad.WADHasher.raw_or_hex_to_hash(chunk_hashes[id]))
+    # incremental: previous wad (the output by default) is the cache of compressed chunks
+    old_wad = None
+    old_manifest = {}
+    out_file = wad_file
+    if incremental:
+        if old_wad_file == None:
+            old_wad_file = wad_file
+        old_manifest = read_pack_manifest(raw_dir, level)
+        if old_manifest != None and os.path.exists(old_wad_file):
+            old_wad = pyRitoFile.wad.WADArchive(old_wad_file)
+            # old wad is still read while the new one is written
+            if os.path.abspath(old_wad_file) == os.path.abspath(wad_file):
+                out_file = wad_file + '.tmp'
+        if old_manifest == None:
+            old_manifest = {}
+    pack_manifest = {}
+    # workers read and compress files, results are written in chunk order
+    # so the output is the same for any worker count
+    executor = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+    pending = deque()
+    try:
+        with pyRitoFile.wad.WADWriter(out_file, len(chunk_ids)) as writer:
+            for id in chunk_ids:
+                chunk = pyRitoFile.wad.WADChunk.default(hash=chunk_hashes[id])
+                old_entry = old_manifest.get(chunk_hashes[id])
+                if executor == None:
+                    write_packed_chunk(writer, *pack_chunk(chunk, chunk_datas[id], level, old_wad, old_entry, buffer_size), pack_manifest)
+                    continue
+                pending.append(executor.submit(pack_chunk, chunk, chunk_datas[id], level, old_wad, old_entry, buffer_size))
+                # bound chunks in flight so compressed data does not pile up
+                if len(pending) >= workers * 2:
+                    write_packed_chunk(writer, *pending.popleft().result(), pack_manifest)
+            while len(pending) > 0:
+                write_packed_chunk(writer, *pending.popleft().result(), pack_manifest)
+    finally:
+        if executor != None:
+            executor.shutdown(cancel_futures=True)
+        if old_wad != None:
+            old_wad.close()
+    if out_file != wad_file:
+        os.replace(out_file, wad_file)
+    if incremental:
+        with open(lepath.join(raw_dir, 'pack_manifest.json'), 'w+', encoding='utf-8') as f:
+            json.dump({'version': 1, 'level': level, 'chunks': pack_manifest}, f, ensure_ascii=False)
+
+
+def transform(src_wads, dst, rules=None, hashtables=None):
+    # build a new wad from chunks of other wads without decompressing them
+    # compressed bytes and toc values are copied verbatim, dupes are shared by checksum
+    # src_wads: list of wad files, on same path the later wad overrides the earlier
+    # rules: {
+    #   'include', 'exclude', 'extensions', 'regex', 'max_size': same as unpack filter,
+    #   'rename': {old path: new path},
+    #   'override': 'last' (default) or 'first' wad wins on same path
+    # }
+    # hashtables: to match rules against paths instead of hashes
+    print(f'wad_tool: Start:  Transform WAD: {dst}')
+    if rules == None:
+        rules = {}
+    filter = ChunkFilter(
+        include=rules.get('include'),
+        exclude=rules.get('exclude'),
+        extensions=rules.get('extensions'),
+        regex=rules.get('regex'),
+        max_size=rules.get('max_size')
+    )
+    rename = rules.get('rename', {})
+    override_first = rules.get('override', 'last') == 'first'
+    archives = []
+    # {output hash: (archive, source chunk, output path)}
+    out_chunks = {}
+    out_file = dst
+    try:
+        for src_wad in src_wads:
+            archive = pyRitoFile.wad.WADArchive(src_wad)
+            archives.append(archive)
+            # dst is one of the sources: write to a temp file first
+            if os.path.abspath(src_wad) == os.path.abspath(dst):
+                out_file = dst + '.tmp'
+            archive.wad.un_hash(hashtables)
+            for chunk in archive.wad.chunks:
+                if not filter.match(chunk, archive.bs):
+                    continue
+                path = rename.get(chunk.hash, chunk.hash)
+                hash = pyRitoFile.wad.WADHasher.raw_or_hex_to_hash(path)
+                if override_first and hash in out_chunks:
+                    continue
+                out_chunks[hash] = (archive, chunk, path)
+        # subchunked chunks (ZstdChunked) are copied with their subchunk count and start,
+        # the start is an index into the .subchunktoc chunk of their source wad (copied like any chunk)
+        # chunks of many wads would need those tocs merged, which is not done here
+        subchunked_wads = sorted(set(archive.path for archive, chunk, path in out_chunks.values() if chunk.subchunk_count > 0))
+        if len(subchunked_wads) > 1:
+            raise Exception(
+                f'wad_tool: Error: Transform WAD: {dst}: subchunked chunks from more than one WAD: {", ".join(subchunked_wads)}, their subchunk TOCs can not be merged.')
+        # sorted by path hash, same as the toc, so the new wad is written front to back
+        with pyRitoFile.wad.WADWriter(out_file, len(out_chunks)) as writer:
+            for hash in sorted(out_chunks):
+                archive, src_chunk, path = out_chunks[hash]
+                chunk = pyRitoFile.wad.WADChunk.default(hash=path)
+                reuse_chunk(chunk, src_chunk, archive.read_raw(archive.wad.index.hashes[src_chunk.id]))
+                writer.write_chunk(chunk)
+                chunk.free_data()
+                print(f'wad_tool: Finish: Transform: {src_chunk.hash} -> {path}')
+    finally:
+        for archive in archives:
+            archive.close()
+    if out_file != dst:
+        os.replace(out_file, dst)
+    print(f'wad_tool: Finish: Transform WAD: {dst}: {len(out_chunks)} chunks from {len(src_wads)} WADs')
+    return len(out_chunks)
+
+
+def read_toc_entries(wad_file, hashtables):
+    # {path or hex: (checksum, compressed size, decompressed size)} from the toc only
+    if wad_file == None or not os.path.exists(wad_file):
+        return {}
+    index = pyRitoFile.wad.WAD().read(wad_file, mmap=True).index
+    if hashtables != None:
+        paths = pyRitoFile.wad.WADHasher.hashes_to_raws(hashtables, index.hashes)
+    else:
+        paths = [pyRitoFile.wad.WADHasher.hash_to_hex(hash) for hash in index.hashes]
+    entries = {}
+    for path, checksum, compressed_size, decompressed_size in zip(paths, index.checksums, index.compressed_sizes, index.decompressed_sizes):
+        entries[path] = (checksum, compressed_size, decompressed_size)
+    return entries
+
+
+def diff(old_wad, new_wad, hashtables=None, extract_dir=None, workers=None):
+    # compare two wads by toc: path hash + xxh3 checksum of compressed data + sizes
+    # nothing is decompressed, old_wad or new_wad can be None/missing = empty wad
+    # extract_dir: extract added and modified chunks of new_wad there
+    old_entries = read_toc_entries(old_wad, hashtables)
+    new_entries = read_toc_entries(new_wad, hashtables)
+    result = {
+        'added': sorted(path for path in new_entries if path not in old_entries),
+        'removed': sorted(path for path in old_entries if path not in new_entries),
+        'modified': sorted(path for path in new_entries if path in old_entries and new_entries[path] != old_entries[path])
+    }
+    print(f'wad_tool: Finish: Diff WAD: {new_wad}: {len(result["added"])} added, {len(result["removed"])} removed, {len(result["modified"])} modified')
+    if extract_dir != None:
+        changed = result['added'] + result['modified']
+        if len(changed) > 0:
+            if workers == None:
+                workers = os.cpu_count() or 1
+            unpack(new_wad, extract_dir, hashtables, filter=changed, workers=workers, manifest=False)
+    return result
+
+
+def diff_dir(old_dir, new_dir, hashtables=None, extract_dir=None, workers=None):
+    # diff every wad of two game folders (Game/DATA/FINAL), paired by relative path
+    # changed chunks of each wad go to extract_dir/<wad relative path>
+    def list_wads(dir):
+        wad_files = set()
+        for root, dirs, files in os.walk(dir):
+            for file in files:
+                if file.endswith('.wad.client') or file.endswith('.wad'):
+                    wad_files.add(lepath.rel(lepath.join(root, file), dir))
+        return wad_files
+    print(f'wad_tool: Start:  Diff WADs: {old_dir} -> {new_dir}')
+    old_wads = list_wads(old_dir)
+    new_wads = list_wads(new_dir)
+    # biggest first so one big wad does not finish last alone
+    wad_files = sorted(
+        old_wads | new_wads,
+        key=lambda rel: os.path.getsize(lepath.join(new_dir, rel)) if rel in new_wads else 0,
+        reverse=True
+    )
+    # workers go to wads, each wad is extracted by one thread: no workers * workers threads
+    def diff_one(rel):
+        return diff(
+            lepath.join(old_dir, rel) if rel in old_wads else None,
+            lepath.join(new_dir, rel) if rel in new_wads else None,
+            hashtables,
+            lepath.join(extract_dir, rel) if extract_dir != None and rel in new_wads else None,
+            workers=1
+        )
+    if workers == None:
+        workers = os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers=max(min(workers, len(wad_files)), 1)) as executor:
+        results = dict(zip(wad_files, executor.map(diff_one, wad_files)))
+    # only wads with changes
+    results = {rel: results[rel] for rel in sorted(results) if any(len(paths) > 0 for paths in results[rel].values())}
+    print(f'wad_tool: Finish: Diff WADs: {old_dir} -> {new_dir}: {len(results)} of {len(wad_files)} WADs changed')
+    return results
+
+
+class SizeCounter:
+    # file-like sink of a test decompress: only counts bytes
+    def __init__(self):
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+
+
+def verify_chunk(chunk, raw, check_checksum):
+    # return error messages of one chunk
+    errors = []
+    try:
+        if check_checksum and chunk.checksum != 0 and xxh3_64(raw).intdigest() != chunk.checksum:
+            errors.append(f'Checksum mismatch: {xxh3_64(raw).intdigest():016x}, expected {chunk.checksum:016x}')
+        if chunk.compression_type != pyRitoFile.wad.WADCompressionType.Satellite:
+            # streamed test decompress, nothing is kept
+            counter = SizeCounter()
+            chunk.decompress_to_file(raw, counter)
+            if counter.size != chunk.decompressed_size:
+                errors.append(f'Decompressed size: {counter.size}, expected {chunk.decompressed_size}')
+    except Exception as e:
+        errors.append(f'Decompress failed: {e}')
+    finally:
+        raw.release()
+    return errors
+
+
+def verify(wad_file, workers=1, hashtables=None, report_file=None):
+    # check a wad without extracting it:
+    # toc offsets/sizes inside the file, xxh3 checksum of each chunk (version 3.1+)
+    # and a streamed test decompress of each chunk against its decompressed size
+    # return a json-able report, also written to report_file if set
+    print(f'wad_tool: Start:  Verify WAD: {wad_file}')
+    start_time = time.perf_counter()
+    report = {
+        'wad': wad_file,
+        'version': None,
+        'chunks': 0,
+        'verified': 0,
+        'bytes': 0,
+        'seconds': 0,
+        'ok': False,
+        'errors': []
+    }
+    errors = report['errors']
+    def add_error(chunk_id, hash, error):
+        if hashtables != None:
+            path = pyRitoFile.wad.WADHasher.hash_to_raw(hashtables, hash)
+        else:
+            path = pyRitoFile.wad.WADHasher.hash_to_hex(hash)
+        errors.append({'id': chunk_id, 'path': path, 'error': error})
+    executor = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+    pending = deque()
+    try:
+        with pyRitoFile.stream.BytesStream.reader(wad_file, mmap=True) as bs:
+            wad = pyRitoFile.wad.WAD()
+            wad.read_toc(bs, wad_file)
+            index = wad.index
+            report['version'] = wad.version
+            report['chunks'] = len(index)
+            # chunk data can only be after the toc
+            data_start = bs.tell()
+            file_size = os.path.getsize(wad_file)
+            # version 3.0 checksums are not xxh3
+            check_checksum = wad.version >= 3.1
+            # duplicated chunks share data, verify it once
+            verified_keys = set()
+            # offset order, the wad is read front to back
+            for id in sorted(range(len(index)), key=lambda id: index.offsets[id]):
+                try:
+                    chunk = index.chunk(id)
+                except Exception as e:
+                    add_error(id, index.hashes[id], f'Bad toc entry: {e}')
+                    continue
+                if chunk.offset < data_start or chunk.offset + chunk.compressed_size > file_size:
+                    add_error(id, index.hashes[id], f'Data out of file: offset {chunk.offset}, size {chunk.compressed_size}, file size {file_size}')
+                    continue
+                key = (chunk.offset, chunk.compressed_size, chunk.decompressed_size, chunk.compression_type, chunk.checksum)
+                if key in verified_keys:
+                    continue
+                verified_keys.add(key)
+                report['verified'] += 1
+                report['bytes'] += chunk.compressed_size
+                bs.seek(chunk.offset)
+                raw = bs.read_view(chunk.compressed_size)
+                if executor == None:
+                    for error in verify_chunk(chunk, raw, check_checksum):
+                        add_error(id, index.hashes[id], error)
+                    continue
+                pending.append((id, executor.submit(verify_chunk, chunk, raw, check_checksum)))
+                if len(pending) >= workers * 2:
+                    pending_id, future = pending.popleft()
+                    for error in future.result():
+                        add_error(pending_id, index.hashes[pending_id], error)
+            while len(pending) > 0:
+                pending_id, future = pending.popleft()
+                for error in future.result():
+                    add_error(pending_id, index.hashes[pending_id], error)
+    except Exception as e:
+        errors.append({'id': None, 'path': None, 'error': f'Bad WAD: {e}'})
+    finally:
+        if executor != None:
+            executor.shutdown(cancel_futures=True)
+    errors.sort(key=lambda error: -1 if error['id'] == None else error['id'])
+    report['seconds'] = time.perf_counter() - start_time
+    report['ok'] = len(errors) == 0
+    if report_file != None:
+        with open(report_file, 'w+', encoding='utf-8') as f:
+            json.dump(report, f, indent=4, ensure_ascii=False)
+    print(f'wad_tool: Finish: Verify WAD: {wad_file}: {"OK" if report["ok"] else "CORRUPT"}, {report["verified"]} chunks, {len(errors)} errors in {report["seconds"]:.2f}s')
+    return report
+
+
+# hashtables of a unpack_batch worker process
+batch_hashtables = None
+
+
+def init_batch_worker(hashtables_loader, hashtables):
+    global batch_hashtables
+    if hashtables_loader != None:
+        # the parent loaded them first, anything to build is built already
+        batch_hashtables = hashtables_loader(compile=False)
+    elif hashtables != None:
+        batch_hashtables = hashtables
+
+
+def unpack_batch_wad(wad_file, raw_dir, unpack_args):
+    # unpack one wad in a worker, errors go to the summary instead of stopping the batch
+    try:
+        return wad_file, unpack(wad_file, raw_dir, batch_hashtables, **unpack_args), None
+    except Exception as e:
+        print(f'wad_tool: Error: Unpack WAD: {wad_file}: {e}')
+        return wad_file, None, str(e)
+
 
+def unpack_batch(src, dst=None, hashtables=None, processes=None, hashtables_loader=None, summary_file=None, **unpack_args):
+    # unpack every wad of src (dir or list of wad files) across a process pool
+    # dst: unpack to dst/<wad relative path without .wad.client>, None = next to each wad
+    # workers are started by forkserver (spawn where there is none): not forked from this
+    # process, which may run threads already (backend, gui)
+    # the parent calls hashtables_loader() once, so tables are compiled once, then each worker
+    # calls hashtables_loader(compile=False) to only map them (hash_helper.Storage.wad_hashes_loader)
+    # without a loader, workers get hashtables pickled once
+    # unpack_args: more arguments of unpack (include, extensions, manifest...)
+    # return combined summary, also written to summary_file if set
+    global batch_hashtables
+    if isinstance(src, str):
+        src_dir = src
+        wad_files = []
+        for root, dirs, files in os.walk(src):
+            for file in files:
+                if file.endswith('.wad.client'):
+                    wad_files.append(lepath.join(root, file))
+    else:
+        src_dir = None
+        wad_files = list(src)
+    def raw_dir_of(wad_file):
+        if dst == None:
+            return lepath.ext(wad_file, '.wad.client', '.wad')
+        rel = lepath.rel(wad_file, src_dir) if src_dir != None else os.path.basename(wad_file)
+        return lepath.ext(lepath.join(dst, rel), '.wad.client', '.wad')
+    # biggest first: a big wad started last would leave the other processes idle
+    wad_files.sort(key=lambda wad_file: os.path.getsize(wad_file), reverse=True)
+    if processes == None:
+        processes = os.cpu_count() or 1
+    processes = max(min(processes, len(wad_files)), 1)
+    print(f'wad_tool: Start:  Unpack WADs: {len(wad_files)} WADs, {processes} processes')
+    start_time = time.perf_counter()
+    results = []
+    if processes == 1:
+        if hashtables == None and hashtables_loader != None:
+            hashtables = hashtables_loader()
+        batch_hashtables = hashtables
+        try:
+            results = [unpack_batch_wad(wad_file, raw_dir_of(wad_file), unpack_args) for wad_file in wad_files]
+        finally:
+            batch_hashtables = None
+    else:
+        if hashtables == None and hashtables_loader != None:
+            hashtables_loader()
+        if 'forkserver' in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context('forkserver')
+        else:
+            context = multiprocessing.get_context('spawn')
+        initargs = (hashtables_loader, hashtables if hashtables_loader == None else None)
+        try:
+            with ProcessPoolExecutor(max_workers=processes, mp_context=context, initializer=init_batch_worker, initargs=initargs) as executor:
+                futures = [executor.submit(unpack_batch_wad, wad_file, raw_dir_of(wad_file), unpack_args) for wad_file in wad_files]
+                results = [future.result() for future in futures]
+        finally:
+            batch_hashtables = None
+    seconds = max(time.perf_counter() - start_time, 1e-9)
+    summary = {
+        'wads': len(wad_files),
+        'failed': 0,
+        'chunks': 0,
+        'bytes': 0,
+        'skipped': 0,
+        'seconds': seconds,
+        'processes': processes,
+        'results': {}
+    }
+    for wad_file, stats, error in results:
+        if error != None:
+            summary['failed'] += 1
+            summary['results'][wad_file] = {'error': error}
+            continue
+        summary['chunks'] += stats['chunks']
+        summary['bytes'] += stats['bytes']
+        summary['skipped'] += stats['skipped']
+        summary['results'][wad_file] = stats
+    summary['mb_per_second'] = summary['bytes'] / 1024**2 / seconds
+    if summary_file != None:
+        with open(summary_file, 'w+', encoding='utf-8') as f:
+            json.dump(summary, f, indent=4, ensure_ascii=False)
+    print(f'wad_tool: Finish: Unpack WADs: {len(wad_files)} WADs ({summary["failed"]} failed), {summary["chunks"]} chunks, {summary["bytes"]/1024**2:.2f} MB in {seconds:.2f}s ({summary["mb_per_second"]:.2f} MB/s, {processes} processes)')
+    return summary
@@ -0,0 +1,83 @@
+import sys
+from io import BytesIO
+from struct import Struct
+from timeit import repeat
+from LtMAO.pyRitoFile.stream import BytesStream, BufferReader
+from LtMAO.pyRitoFile.structs import Vector
+
+# micro benchmark: per call cost of small reads
+# legacy = compile Struct every call + read from BytesIO (old BytesStream)
+# stream = BytesStream over BytesIO with cached structs
+# buffer = BufferReader over bytes with cached structs + unpack_from
+
+CALLS = 200000
+
+
+class LegacyStream:
+    def __init__(self, f):
+        self.stream = f
+
+    def seek(self, pos):
+        self.stream.seek(pos)
+
+    def read_u32(self, count=1):
+        return Struct(f'<{count}I').unpack(self.stream.read(count*4))
+
+    def read_f32(self, count=1):
+        return Struct(f'<{count}f').unpack(self.stream.read(count*4))
+
+    def read_vec3(self, count=1):
+        floats = Struct(f'<{count*3}f').unpack(self.stream.read(count*12))
+        return [Vector(floats[i], floats[i+1], floats[i+2]) for i in range(0, len(floats), 3)]
+
+    def read_s_sized16(self, encoding='ascii'):
+        return self.stream.read(Struct('H').unpack(self.stream.read(2))[0]).decode(encoding),
+
+
+def make_data():
+    bs = BytesStream(BytesIO())
+    for i in range(CALLS):
+        bs.write_u32(i)
+    return bs.raw()
+
+
+def make_strings():
+    bs = BytesStream(BytesIO())
+    for i in range(CALLS):
+        bs.write_s_sized16(f'string{i%1000:04}')
+    return bs.raw()
+
+
+def bench(name, make_reader, data, func_name, size):
+    calls = len(data) // size
+    bs = make_reader(data)
+    func = getattr(bs, func_name)
+    def run():
+        bs.seek(0)
+        for i in range(calls):
+            func()
+    return min(repeat(run, number=1, repeat=5)) / calls * 1e9
+
+
+def main():
+    data = make_data()
+    strings = make_strings()
+    readers = (
+        ('legacy', lambda data: LegacyStream(BytesIO(data))),
+        ('stream', lambda data: BytesStream(BytesIO(data))),
+        ('buffer', lambda data: BufferReader(data)),
+    )
+    cases = (
+        ('read_u32', data, 4),
+        ('read_f32', data, 4),
+        ('read_vec3', data, 12),
+        ('read_s_sized16', strings, 12),
+    )
+    print(f'{"call":<16}' + ''.join(f'{name:>12}' for name, _ in readers) + f'{"speedup":>12}')
+    for func_name, case_data, size in cases:
+        results = [bench(name, make_reader, case_data, func_name, size) for name, make_reader in readers]
+        print(f'{func_name:<16}' + ''.join(f'{ns:>9.0f} ns' for ns in results) + f'{results[0]/results[-1]:>11.1f}x')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
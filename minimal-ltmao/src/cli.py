@@ -7,7 +7,7 @@ def parse_arguments():
         prog='LtMAO command line interface',
         description='LtMAO stuffs here.')
     parser.add_argument('-t', '--tool', type=str,
-                        help='Which tool to use: wadpack, wadunpack')
+                        help='Which tool to use: wadpack, wadpack_incremental, wadunpack, wadunpack_incremental, wadverify, waddiff')
     parser.add_argument('-src', '--source', type=str, help='Input file')
     parser.add_argument('-dst', '--destination',
                         type=str, help='Output file')
@@ -25,8 +25,9 @@ def ensure_curdir():
 
 class CLI:
     @staticmethod
-    def wadpack(src, dst):
+    def wadpack(src, dst, incremental=False):
         from LtMAO import wad_tool
+        import os
         if dst == None:
             dst = src
             if dst.endswith('.wad'):
@@ -34,29 +35,63 @@ class CLI:
             else:
                 if not dst.endswith('.wad.client'):
                     dst += '.wad.client'
-        wad_tool.pack(src, dst)
+        wad_tool.pack(src, dst, workers=os.cpu_count() or 1, incremental=incremental)
 
     @staticmethod
-    def wadunpack(src, dst):
+    def wadunpack(src, dst, incremental=False):
         from LtMAO import lepath, wad_tool, hash_helper
+        import os
         if dst == None:
             dst = lepath.ext(src, '.wad.client', '.wad')
         hash_helper.Storage.read_wad_hashes()
-        wad_tool.unpack(src, dst, hash_helper.Storage.hashtables)
+        wad_tool.unpack(src, dst, hash_helper.Storage.hashtables, workers=os.cpu_count() or 1, manifest=incremental)
         hash_helper.Storage.free_wad_hashes()
 
     @staticmethod
     def wadunpack_all(src, dst):
+        # one process per core, wads next to themselves or in dst
         from LtMAO import lepath, wad_tool, hash_helper
-        import os
+        summary_file = lepath.join(dst, 'unpack_summary.json') if dst != None else None
+        if dst != None:
+            import os
+            os.makedirs(dst, exist_ok=True)
+        wad_tool.unpack_batch(src, dst, hashtables_loader=hash_helper.Storage.wad_hashes_loader(), summary_file=summary_file)
+        hash_helper.Storage.free_wad_hashes()
+
+    @staticmethod
+    def wadverify(src, dst):
+        # src: wad file or dir of wads, dst: json report file (optional)
+        from LtMAO import lepath, wad_tool
+        import os, json
+        wad_files = [src]
+        if os.path.isdir(src):
+            wad_files = []
+            for root, dirs, files in os.walk(src):
+                for file in files:
+                    if file.endswith('.wad.client') or file.endswith('.wad'):
+                        wad_files.append(lepath.join(root, file))
+        reports = [wad_tool.verify(wad_file, workers=os.cpu_count() or 1) for wad_file in wad_files]
+        if dst != None:
+            with open(dst, 'w+', encoding='utf-8') as f:
+                json.dump(reports, f, indent=4, ensure_ascii=False)
+        else:
+            print(json.dumps(reports, indent=4, ensure_ascii=False))
+        # non zero exit code for corrupt wads
+        if not all(report['ok'] for report in reports):
+            sys.exit(1)
+
+    @staticmethod
+    def waddiff(src, dst):
+        # src: old wad or game dir, dst: new wad or game dir, json diff printed
+        from LtMAO import wad_tool, hash_helper
+        import os, json
         hash_helper.Storage.read_wad_hashes()
-        for root, dirs, files in os.walk(src):
-            for file in files:
-                if file.endswith('.wad.client'):
-                    wad = lepath.join(root, file)
-                    dir = lepath.ext(wad, '.wad.client', '.wad')
-                    wad_tool.unpack(wad, dir, hash_helper.Storage.hashtables)
+        if os.path.isdir(src) and os.path.isdir(dst):
+            result = wad_tool.diff_dir(src, dst, hash_helper.Storage.hashtables, workers=os.cpu_count() or 1)
+        else:
+            result = wad_tool.diff(src, dst, hash_helper.Storage.hashtables, workers=os.cpu_count() or 1)
         hash_helper.Storage.free_wad_hashes()
+        print(json.dumps(result, indent=4, ensure_ascii=False))
 
     @staticmethod
     def ritobin(src, dst):
@@ -411,8 +446,12 @@ class CLI:
 def main():
     funcs = {
         'wadpack':          lambda src, dst: CLI.wadpack(src, dst),
+        'wadpack_incremental': lambda src, dst: CLI.wadpack(src, dst, True),
         'wadunpack':        lambda src, dst: CLI.wadunpack(src, dst),
+        'wadunpack_incremental': lambda src, dst: CLI.wadunpack(src, dst, True),
         'wadunpack_all':    lambda src, dst: CLI.wadunpack_all(src, dst),
+        'wadverify':        lambda src, dst: CLI.wadverify(src, dst),
+        'waddiff':          lambda src, dst: CLI.waddiff(src, dst),
 
         'ritobin':          lambda src, dst: CLI.ritobin(src, dst),
         'ritobindir2py':    lambda src, dst: CLI.ritobindir(src, dst, True),
@@ -0,0 +1,4 @@
+import os, sys
+
+# tests import LtMAO from minimal-ltmao/src, same as cli.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
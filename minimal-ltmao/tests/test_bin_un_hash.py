@@ -0,0 +1,62 @@
+from LtMAO import hash_helper, ritobin
+from LtMAO.pyRitoFile.bin import BIN, BINEntry, BINField, BINHasher, BINType
+from LtMAO.pyRitoFile.wad import WADHasher
+
+
+def write_bin(path):
+    entry = BINEntry(hash='Characters/Test/Skins/Skin0', type='SkinCharacterDataProperties', data=[
+        BINField(hash='mCount', type=BINType.U32, data=7),
+        BINField(hash='mName', type=BINType.STRING, data='skin0'),
+        BINField(hash='mHash', type=BINType.HASH, data=BINHasher.raw_to_hex('Skin0Material')),
+        BINField(hash='mTexture', type=BINType.FILE, data=WADHasher.raw_to_hex('assets/test/skin0.dds')),
+    ])
+    BIN(signature='PROP', version=3, is_patch=False, links=[], entries=[entry], patches=[]).write(path)
+
+
+def compile_table(tmp_path, filename, names, hasher, key_size):
+    path = str(tmp_path / f'{filename}.lht')
+    hash_helper.HashTable.write(path, {int(hasher.raw_to_hex(name), 16): name for name in names}, key_size)
+    return hash_helper.HashTable(path)
+
+
+def test_bin_un_hash_with_compiled_tables(tmp_path):
+    bin_path = str(tmp_path / 'skin0.bin')
+    write_bin(bin_path)
+    hashtables = {
+        'hashes.binentries.txt': compile_table(tmp_path, 'hashes.binentries.txt', ['Characters/Test/Skins/Skin0'], BINHasher, 4),
+        'hashes.bintypes.txt': compile_table(tmp_path, 'hashes.bintypes.txt', ['SkinCharacterDataProperties'], BINHasher, 4),
+        'hashes.binfields.txt': compile_table(tmp_path, 'hashes.binfields.txt', ['mCount', 'mName', 'mHash', 'mTexture'], BINHasher, 4),
+        'hashes.binhashes.txt': compile_table(tmp_path, 'hashes.binhashes.txt', ['Skin0Material'], BINHasher, 4),
+        'hashes.game.txt': compile_table(tmp_path, 'hashes.game.txt', ['assets/test/skin0.dds'], WADHasher, 8),
+    }
+    bin = BIN().read(bin_path)
+    bin.un_hash(hashtables)
+    entry = bin.entries[0]
+    assert entry.hash == 'Characters/Test/Skins/Skin0'
+    assert entry.type == 'SkinCharacterDataProperties'
+    fields = {field.hash: field for field in entry.data}
+    assert sorted(fields) == ['mCount', 'mHash', 'mName', 'mTexture']
+    # field types are BINType, not hashes: left as they are
+    assert fields['mCount'].type == BINType.U32
+    assert fields['mCount'].data == 7
+    assert fields['mHash'].data == 'Skin0Material'
+    assert fields['mTexture'].data == 'assets/test/skin0.dds'
+
+
+def test_ritobin_text_with_compiled_tables(tmp_path):
+    bin_path = str(tmp_path / 'skin0.bin')
+    write_bin(bin_path)
+    hashtables = {
+        'hashes.binfields.txt': compile_table(tmp_path, 'hashes.binfields.txt', ['mCount'], BINHasher, 4),
+    }
+    text_path = str(tmp_path / 'skin0.py')
+    ritobin.bin_to_text(bin_path, text_path, hashtables=hashtables)
+    with open(text_path, 'r', encoding='utf-8') as f:
+        assert 'mCount: u32 = 7' in f.read()
+
+
+def test_hashtable_lookup_of_non_hex_key():
+    hashtable = hash_helper.HashTable.from_hashes({0x12345678: 'Foo'}, 4)
+    assert hashtable.get('12345678') == 'Foo'
+    assert hashtable.get(BINType.U32) == None
+    assert BINType.U32 not in hashtable
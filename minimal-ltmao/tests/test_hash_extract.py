@@ -0,0 +1,64 @@
+import os
+import pytest
+from LtMAO import hash_helper
+from LtMAO.pyRitoFile.bin import BIN, BINEntry, BINField, BINType
+
+ExtractedHashes = hash_helper.ExtractedHashes
+CustomHashes = hash_helper.CustomHashes
+
+
+@pytest.fixture
+def combined(tmp_path, monkeypatch):
+    for name, cls in (('cdtb', hash_helper.CDTBHashes), ('extracted', ExtractedHashes), ('custom', CustomHashes), ('compiled', hash_helper.CompiledHashes)):
+        local_dir = str(tmp_path / name)
+        os.makedirs(local_dir)
+        monkeypatch.setattr(cls, 'local_dir', local_dir)
+    monkeypatch.setattr(hash_helper.Storage, 'hashtables', {key: {} for key in hash_helper.ALL_HASHES})
+    monkeypatch.setattr(hash_helper.Storage, 'tables', {})
+    # record which tables get recombined
+    combined = []
+    combine_custom_hashes = CustomHashes.combine_custom_hashes
+    def record_combine(*filenames):
+        combined.extend(filenames)
+        combine_custom_hashes(*filenames)
+    monkeypatch.setattr(CustomHashes, 'combine_custom_hashes', record_combine)
+    return combined
+
+
+def write_bin(path, value):
+    entry = BINEntry(hash='Characters/Test/Skins/Skin0', type='SkinCharacterDataProperties', data=[
+        BINField(hash='mTexture', type=BINType.STRING, data=value),
+    ])
+    BIN(signature='PROP', version=3, is_patch=False, links=[], entries=[entry], patches=[]).write(path)
+
+
+def test_extract_writes_only_tables_with_new_hashes(tmp_path, combined):
+    bin_path = str(tmp_path / 'skin0.bin')
+    write_bin(bin_path, 'ASSETS/Test/Skin0.tex')
+    ExtractedHashes.extract(bin_path, processes=1)
+    assert combined == ['hashes.game.txt']
+    assert sorted(os.listdir(ExtractedHashes.local_dir)) == ['extract_cache.json', 'hashes.game.txt']
+    assert os.path.exists(CustomHashes.local_file('hashes.game.txt'))
+    # same file again: cached, nothing new, nothing written
+    combined.clear()
+    ExtractedHashes.extract(bin_path, processes=1)
+    assert combined == []
+
+
+def test_extract_does_not_cache_unreadable_files(tmp_path, combined, monkeypatch):
+    bin_path = str(tmp_path / 'broken.bin')
+    with open(bin_path, 'wb') as f:
+        f.write(b'PROP' + b'\xff' * 16)
+    ExtractedHashes.extract(bin_path, processes=1)
+    assert ExtractedHashes.read_cache() == {}
+    assert combined == []
+    assert not os.path.exists(ExtractedHashes.local_file('hashes.game.txt'))
+    # tried again next time
+    extract_data = ExtractedHashes.extract_data
+    calls = []
+    def record_extract_data(extension, path, raw=False):
+        calls.append(path)
+        return extract_data(extension, path, raw)
+    monkeypatch.setattr(ExtractedHashes, 'extract_data', record_extract_data)
+    ExtractedHashes.extract(bin_path, processes=1)
+    assert calls == [bin_path]
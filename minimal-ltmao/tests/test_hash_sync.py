@@ -0,0 +1,248 @@
+import hashlib, os, socket, threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import pytest
+from LtMAO import hash_helper
+
+CDTBHashes = hash_helper.CDTBHashes
+CustomHashes = hash_helper.CustomHashes
+
+
+class HashServer:
+    # local stand-in of the CDTB hash server: ETag, If-None-Match, Range + If-Range
+    def __init__(self):
+        self.files = {}
+        # {filename: bytes} to send before dropping the connection, once
+        self.cuts = {}
+        # (filename, request headers) of every GET
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                filename = self.path.split('/')[-1]
+                server.requests.append((filename, dict(self.headers)))
+                data = server.files[filename]
+                etag = server.etag(filename)
+                if self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.end_headers()
+                    return
+                start = 0
+                if self.headers.get('Range') != None and self.headers.get('If-Range') == etag:
+                    start = int(self.headers['Range'].split('=')[1].split('-')[0])
+                    self.send_response(206)
+                    self.send_header('Content-Range', f'bytes {start}-{len(data)-1}/{len(data)}')
+                else:
+                    self.send_response(200)
+                body = data[start:]
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                if filename in server.cuts:
+                    self.wfile.write(body[:server.cuts.pop(filename)])
+                    self.wfile.flush()
+                    self.connection.shutdown(socket.SHUT_RDWR)
+                    self.close_connection = True
+                    return
+                self.wfile.write(body)
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        self.url = f'http://127.0.0.1:{self.httpd.server_port}'
+
+    def etag(self, filename):
+        return '"' + hashlib.md5(self.files[filename]).hexdigest() + '"'
+
+    def set_file(self, filename, version, count):
+        sep = hash_helper.get_hash_separator(filename)
+        self.files[filename] = ''.join(
+            f'{(i * 2654435761 + version) % 16**sep:0{sep}x} {version}/{filename}/{i}\n' for i in range(count)
+        ).encode('utf-8')
+
+    def requests_of(self, filename):
+        return [headers for name, headers in self.requests if name == filename]
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    server = HashServer()
+    for filename in hash_helper.ALL_HASHES:
+        server.set_file(filename, 1, 2000)
+    for name, cls in (('cdtb', CDTBHashes), ('extracted', hash_helper.ExtractedHashes), ('custom', CustomHashes), ('compiled', hash_helper.CompiledHashes)):
+        local_dir = str(tmp_path / name)
+        os.makedirs(local_dir)
+        monkeypatch.setattr(cls, 'local_dir', local_dir)
+    monkeypatch.setattr(CDTBHashes, 'remote_dir', server.url)
+    monkeypatch.setattr(hash_helper.Storage, 'hashtables', {key: {} for key in hash_helper.ALL_HASHES})
+    monkeypatch.setattr(hash_helper.Storage, 'tables', {})
+    monkeypatch.setattr(CDTBHashes, 'etag_path', str(tmp_path / 'cdtb' / 'etag.json'))
+    monkeypatch.setattr(CDTBHashes, 'last_modified_path', str(tmp_path / 'cdtb' / 'last_modified.json'))
+    # record which tables get recombined
+    server.combined = []
+    combine_custom_hashes = CustomHashes.combine_custom_hashes
+    def record_combine(*filenames):
+        server.combined.extend(filenames)
+        combine_custom_hashes(*filenames)
+    monkeypatch.setattr(CustomHashes, 'combine_custom_hashes', record_combine)
+    yield server
+    server.close()
+
+
+def read_local(filename):
+    with open(CDTBHashes.local_file(filename), 'rb') as f:
+        return f.read()
+
+
+def assert_custom_has(server, filename):
+    # every server hash ends up in the compiled custom table
+    hashtable = hash_helper.CompiledHashes.open(filename)
+    sep = hash_helper.get_hash_separator(filename)
+    for line in server.files[filename].decode('utf-8').splitlines():
+        assert hashtable.get(line[:sep]) == line[sep+1:]
+
+
+def test_first_sync_downloads_all(server):
+    CDTBHashes.sync_all()
+    for filename in hash_helper.ALL_HASHES:
+        assert sorted(read_local(filename).splitlines()) == sorted(server.files[filename].splitlines())
+        assert_custom_has(server, filename)
+    assert sorted(server.combined) == sorted(hash_helper.ALL_HASHES)
+
+
+def test_unchanged_files_are_not_modified(server):
+    CDTBHashes.sync_all()
+    server.requests.clear()
+    server.combined.clear()
+    CDTBHashes.sync_all()
+    for filename in hash_helper.ALL_HASHES:
+        headers, = server.requests_of(filename)
+        assert headers['If-None-Match'] == server.etag(filename)
+    assert server.combined == []
+
+
+def test_interrupted_download_resumes_with_range(server):
+    filename = 'hashes.game.txt'
+    server.set_file(filename, 1, 200000)
+    server.cuts[filename] = 1024**2
+    CDTBHashes.sync_all()
+    assert os.path.exists(CDTBHashes.part_file(filename))
+    part_size = os.path.getsize(CDTBHashes.part_file(filename))
+    assert part_size > 0
+    server.requests.clear()
+    CDTBHashes.sync_all()
+    headers, = server.requests_of(filename)
+    assert headers['Range'] == f'bytes={part_size}-'
+    assert headers['If-Range'] == server.etag(filename)
+    assert not os.path.exists(CDTBHashes.part_file(filename))
+    assert sorted(read_local(filename).splitlines()) == sorted(server.files[filename].splitlines())
+    assert_custom_has(server, filename)
+
+
+def test_changed_upstream_file_is_downloaded_again_in_full(server):
+    filename = 'hashes.game.txt'
+    server.set_file(filename, 1, 200000)
+    server.cuts[filename] = 1024**2
+    CDTBHashes.sync_all()
+    old_etag = server.etag(filename)
+    # upstream changes while the part file waits: If-Range no longer matches
+    server.set_file(filename, 2, 150000)
+    server.requests.clear()
+    CDTBHashes.sync_all()
+    headers, = server.requests_of(filename)
+    assert headers['If-Range'] == old_etag
+    assert sorted(read_local(filename).splitlines()) == sorted(server.files[filename].splitlines())
+    assert not os.path.exists(CDTBHashes.part_file(filename))
+    assert_custom_has(server, filename)
+
+
+def test_only_changed_tables_are_recombined(server):
+    CDTBHashes.sync_all()
+    server.combined.clear()
+    server.set_file('hashes.binfields.txt', 2, 100)
+    CDTBHashes.sync_all()
+    assert server.combined == ['hashes.binfields.txt']
+    assert_custom_has(server, 'hashes.binfields.txt')
+
+
+def test_compiled_table_in_use_is_swapped_in_later(server, monkeypatch):
+    filename = 'hashes.binfields.txt'
+    CDTBHashes.sync_all()
+    # windows: a compiled table mapped by some process can not be replaced
+    replace = os.replace
+    def replace_in_use(src, dst):
+        if dst.endswith('.lht'):
+            raise PermissionError(13, 'The process cannot access the file because it is being used by another process', dst)
+        replace(src, dst)
+    monkeypatch.setattr(os, 'replace', replace_in_use)
+    server.set_file(filename, 2, 100)
+    CDTBHashes.sync_all()
+    compiled_file = hash_helper.CompiledHashes.local_file(filename)
+    assert os.path.exists(compiled_file + '.tmp')
+    assert hash_helper.CompiledHashes.open(filename) == None
+    # the txt is up to date and readers fall back to it meanwhile
+    CustomHashes.read_hashes(filename)
+    hashtable = hash_helper.Storage.hashtables[filename]
+    assert hashtable.path == None
+    line = server.files[filename].decode('utf-8').splitlines()[0]
+    assert hashtable.get(line[:8]) == line[9:]
+    # no longer in use: the waiting table is swapped in, not compiled again
+    monkeypatch.setattr(os, 'replace', replace)
+    monkeypatch.setattr(hash_helper.CompiledHashes, 'compile', None)
+    assert hash_helper.CompiledHashes.open(filename) != None
+    assert not os.path.exists(compiled_file + '.tmp')
+    assert_custom_has(server, filename)
+
+
+def test_resident_tables_are_remapped_after_sync(server, monkeypatch):
+    filename = 'hashes.binfields.txt'
+    Storage = hash_helper.Storage
+    monkeypatch.setattr(Storage, 'resident', True)
+    CDTBHashes.sync_all()
+    Storage.acquire(filename)
+    Storage.release(filename)
+    assert Storage.tables[filename]['compiled']
+    # unused resident table is dropped before the recompile, not kept mapped
+    server.set_file(filename, 2, 100)
+    replace = os.replace
+    def replace_in_use(src, dst):
+        if dst.endswith('.lht'):
+            raise PermissionError(13, 'in use', dst)
+        replace(src, dst)
+    monkeypatch.setattr(os, 'replace', replace_in_use)
+    CDTBHashes.sync_all()
+    assert filename not in Storage.tables
+    # swap still blocked: the new hashes come from the txt
+    line = server.files[filename].decode('utf-8').splitlines()[0]
+    Storage.acquire(filename)
+    assert not Storage.tables[filename]['compiled']
+    assert Storage.hashtables[filename].get(line[:8]) == line[9:]
+    Storage.release(filename)
+    # next use maps the compiled table once it could be swapped in
+    monkeypatch.setattr(os, 'replace', replace)
+    Storage.acquire(filename)
+    assert Storage.tables[filename]['compiled']
+    assert Storage.hashtables[filename].get(line[:8]) == line[9:]
+    Storage.release(filename)
+
+
+def test_compiled_tables_follow_the_hash_dir(tmp_path, monkeypatch):
+    filename = 'hashes.bintypes.txt'
+    monkeypatch.setattr(hash_helper.CompiledHashes, 'local_dir', None)
+    for name in ('a', 'b'):
+        hash_dir = tmp_path / name
+        hash_dir.mkdir()
+        with open(hash_dir / filename, 'w', encoding='utf-8') as f:
+            f.write(f'{name * 8} {name}\n')
+        monkeypatch.setattr(CustomHashes, 'local_dir', str(hash_dir))
+        hashtable = hash_helper.CompiledHashes.open(filename)
+        assert hashtable.path == f'{hash_dir}/compiled/{filename}.lht'
+        assert hashtable.get(name * 8) == name
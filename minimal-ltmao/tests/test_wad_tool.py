@@ -0,0 +1,143 @@
+import os, struct
+import pytest
+import pyzstd
+from LtMAO import wad_tool, hash_helper
+from LtMAO.pyRitoFile.wad import WAD, WADArchive, WADCompressionType, WADHasher
+
+
+def make_wad(tmp_path, name, files):
+    src = tmp_path / f'{name}_src'
+    src.mkdir()
+    for path, data in files.items():
+        with open(src / WADHasher.raw_to_hex(path), 'wb') as f:
+            f.write(data)
+    wad_file = str(tmp_path / f'{name}.wad.client')
+    wad_tool.pack(str(src), wad_file)
+    return wad_file
+
+
+def set_subchunks(wad_file, chunk_id, subchunk_count, subchunk_start):
+    # patch one toc entry like a game wad: ZstdChunked with subchunks
+    with open(wad_file, 'r+b') as f:
+        f.seek(272 + chunk_id * 32 + 20)
+        f.write(struct.pack('<BBH', WADCompressionType.ZstdChunked.value | subchunk_count << 4, 0, subchunk_start))
+
+
+def test_write_toc_keeps_subchunks(tmp_path):
+    wad_file = make_wad(tmp_path, 'a', {'data/a.bin': b'PROP' + bytes(100), 'data/b.bin': b'PROP' + bytes(200)})
+    set_subchunks(wad_file, 0, 2, 5)
+    wad = WAD().read(wad_file)
+    copy_file = str(tmp_path / 'copy.wad.client')
+    with open(copy_file, 'wb') as f:
+        f.write(wad.write('', raw=True))
+    copy = WAD().read(copy_file)
+    assert copy.index.types[0] == 0x24
+    assert copy.index.subchunk_starts[0] == 5
+    chunk = copy.index.chunk(0)
+    assert chunk.compression_type == WADCompressionType.ZstdChunked
+    assert chunk.subchunk_count == 2
+
+
+def test_transform_copies_subchunked_chunks(tmp_path):
+    wad_file = make_wad(tmp_path, 'a', {'data/a.bin': b'PROP' + bytes(100), 'data/b.bin': b'PROP' + bytes(200), 'data/c.bin': b'PROP'})
+    set_subchunks(wad_file, 1, 2, 3)
+    subchunked_hash = WAD().read(wad_file).index.chunk(1).hash
+    dst = str(tmp_path / 'out.wad.client')
+    # subset of the wad: the subchunked chunk keeps its toc entry
+    kept = [subchunked_hash, WAD().read(wad_file).index.chunk(2).hash]
+    assert wad_tool.transform([wad_file], dst, {'include': kept}) == 2
+    chunk = next(chunk for chunk in WAD().read(dst).chunks if chunk.hash == subchunked_hash)
+    assert chunk.compression_type == WADCompressionType.ZstdChunked
+    assert chunk.subchunk_count == 2
+    assert chunk.subchunk_start == 3
+
+
+def test_transform_rejects_subchunked_chunks_of_many_wads(tmp_path):
+    a = make_wad(tmp_path, 'a', {'data/a.bin': b'PROP' + bytes(100)})
+    b = make_wad(tmp_path, 'b', {'data/b.bin': b'PROP' + bytes(200)})
+    set_subchunks(a, 0, 2, 0)
+    set_subchunks(b, 0, 2, 0)
+    dst = str(tmp_path / 'out.wad.client')
+    with pytest.raises(Exception, match='subchunk'):
+        wad_tool.transform([a, b], dst)
+    assert not os.path.exists(dst)
+
+
+def test_transform_copies_chunks(tmp_path):
+    a = make_wad(tmp_path, 'a', {'data/a.bin': b'PROP' + bytes(100), 'data/b.bin': b'PROP' + bytes(200)})
+    b = make_wad(tmp_path, 'b', {'data/b.bin': b'PROP' + bytes(300), 'data/c.bin': b'PROP' + bytes(400)})
+    dst = str(tmp_path / 'out.wad.client')
+    assert wad_tool.transform([a, b], dst) == 3
+    entries = wad_tool.read_toc_entries(dst, None)
+    sizes = {path: decompressed_size for path, (checksum, compressed_size, decompressed_size) in entries.items()}
+    assert sizes == {
+        WADHasher.raw_to_hex('data/a.bin'): 104,
+        WADHasher.raw_to_hex('data/b.bin'): 304,
+        WADHasher.raw_to_hex('data/c.bin'): 404,
+    }
+
+
+def test_archive_read_rejects_satellite_chunks(tmp_path):
+    wad_file = make_wad(tmp_path, 'a', {'data/a.bin': b'PROP' + bytes(100), 'data/b.bin': b'PROP' + bytes(200)})
+    with open(wad_file, 'r+b') as f:
+        f.seek(272 + 20)
+        f.write(struct.pack('<B', WADCompressionType.Satellite.value))
+    satellite_hash = WAD().read(wad_file).index.chunk(0).hash
+    with WADArchive(wad_file) as archive:
+        with pytest.raises(Exception, match='Satellite'):
+            archive.read(satellite_hash)
+        other = 'data/b.bin' if WADHasher.raw_to_hex('data/a.bin') == satellite_hash else 'data/a.bin'
+        assert archive.read(other)[:4] == b'PROP'
+
+
+def test_pack_big_files_same_bytes_as_small_ones(tmp_path):
+    # incompressible: zstd stores raw blocks, a streamed frame splits them differently
+    data = os.urandom(512*1024)
+    src = tmp_path / 'src'
+    src.mkdir()
+    with open(src / 'big.bin', 'wb') as f:
+        f.write(data)
+    # buffer_size smaller than the file: not read whole
+    wad_file = str(tmp_path / 'big.wad.client')
+    wad_tool.pack(str(src), wad_file, buffer_size=64*1024)
+    with WADArchive(wad_file) as archive:
+        assert bytes(archive.read_raw('big.bin')) == pyzstd.compress(data)
+        assert archive.read('big.bin') == data
+
+
+def test_unpack_batch_workers_map_tables_of_the_parent_hash_dir(tmp_path, monkeypatch):
+    names = ['data/a.bin', 'data/b.bin']
+    wad_dir = tmp_path / 'wads'
+    wad_dir.mkdir()
+    for name in ('one', 'two'):
+        os.replace(make_wad(tmp_path, name, {path: b'PROP' + name.encode() for path in names}), wad_dir / f'{name}.wad.client')
+    hash_dir = tmp_path / 'hashes'
+    hash_dir.mkdir()
+    with open(hash_dir / 'hashes.game.txt', 'w', encoding='utf-8') as f:
+        f.writelines(sorted(f'{WADHasher.raw_to_hex(path)} {path}\n' for path in names))
+    monkeypatch.setattr(hash_helper.CustomHashes, 'local_dir', str(hash_dir))
+    monkeypatch.setattr(hash_helper.CompiledHashes, 'local_dir', None)
+    monkeypatch.setattr(hash_helper.Storage, 'hashtables', {key: {} for key in hash_helper.ALL_HASHES})
+    monkeypatch.setattr(hash_helper.Storage, 'tables', {})
+    dst = tmp_path / 'out'
+    summary = wad_tool.unpack_batch(str(wad_dir), str(dst), hashtables_loader=hash_helper.Storage.wad_hashes_loader(), processes=2)
+    hash_helper.Storage.free_wad_hashes()
+    assert summary['failed'] == 0
+    for name in ('one', 'two'):
+        with open(dst / f'{name}.wad' / 'data' / 'a.bin', 'rb') as f:
+            assert f.read() == b'PROP' + name.encode()
+    # compiled once by the parent, workers only mapped it
+    assert sorted(os.listdir(hash_dir / 'compiled')) == ['hashes.game.txt.lht']
+
+
+def test_unpack_manifest_is_opt_in(tmp_path):
+    wad_file = make_wad(tmp_path, 'a', {'data/a.bin': b'PROP' + bytes(100)})
+    hashtables = {'hashes.game.txt': {WADHasher.raw_to_hex('data/a.bin'): 'data/a.bin'}}
+    plain_dir = str(tmp_path / 'plain')
+    wad_tool.unpack(wad_file, plain_dir, hashtables)
+    assert os.listdir(plain_dir) == ['data']
+    incremental_dir = str(tmp_path / 'incremental')
+    wad_tool.unpack(wad_file, incremental_dir, hashtables, manifest=True)
+    assert 'unpack_manifest.json' in os.listdir(incremental_dir)
+    # unchanged: skipped on the next incremental unpack
+    assert wad_tool.unpack(wad_file, incremental_dir, hashtables, manifest=True)['skipped'] == 1
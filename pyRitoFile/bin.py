@@ -57,9 +57,13 @@ class BINHasher:
 
     @staticmethod
     def hex_to_raw(hashtables, hex):
+        # tables are dicts or compiled tables of hash_helper, one lookup each
         for table_name in reversed(BINHasher.HASHTABLE_NAMES):
-            if table_name in hashtables and hex in hashtables[table_name]:
-                return hashtables[table_name][hex]
+            hashtable = hashtables.get(table_name)
+            if hashtable != None:
+                raw = hashtable.get(hex)
+                if raw != None:
+                    return raw
         return hex
     
     @staticmethod